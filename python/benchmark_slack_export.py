@@ -0,0 +1,129 @@
+import argparse
+import importlib
+import re
+import timeit
+
+# The extraction script's file name isn't a valid module name, so it is imported by name
+slack_export = importlib.import_module("extract-work-from-slack-export")
+
+
+def clean_line_reference(line, org_prefix, org_fallback_pattern):
+    """The original one-regex-at-a-time cleaning, kept to check and time the compiled clean_line against."""
+    # Remove escape characters and quotation marks
+    line = line.replace('\\/', '/').replace('"', '')
+
+    # Simplify URLs by removing the "https://github.com" part
+    # Modify the substitution to handle 'issues' differently
+    def replace_github_url(match):
+        url_part = match.group(1)
+        display_part = match.group(2)
+        if 'issues' in url_part:
+            # For issue URLs, keep both parts
+            # Remove issue number from url_part
+            url_part = re.sub(r'(/issues)/\d+', r'\1', url_part)
+            return url_part + '|' + display_part
+        else:
+            # For other URLs, keep only the URL part before the '|'
+            return url_part
+
+    line = re.sub(r'<https:\/\/github\.com\/([^|>]+)\|([^>]+)>', replace_github_url, line)
+    line = re.sub(r'https:\/\/github\.com\/', '', line)
+
+    # Remove backticks around GitHub links
+    line = re.sub(r'`([^`]+)`', r'\1', line)
+
+    # Remove asterisks
+    line = line.replace('*', '')
+
+    # Remove the word "commit" and commit IDs
+    line = re.sub(r'commit\/[a-f0-9]{40}\|', '', line)
+    line = re.sub(r'[a-f0-9]{7,40}', '', line)
+    # Remove trailing "/commit/"
+    line = re.sub(r'/commit/', '', line)
+
+    # Remove org-specific fallback line if pattern is provided and not empty
+    if org_fallback_pattern.strip():
+        line = re.sub(org_fallback_pattern, '', line)
+
+    # Remove org prefix from repository paths if provided and not empty
+    if org_prefix.strip():
+        line = re.sub(r'\b' + re.escape(org_prefix), '', line)
+
+    # Remove "/compare/..." from "pretext" lines
+    line = re.sub(r'/compare/\.\.\.', '', line)
+
+    # Remove the labels "fallback:", "text:", "title:", and "pretext:"
+    line = re.sub(r'^\s*(fallback:|text:|title:|pretext:)\s*', '', line)
+
+    # Remove unnecessary labels like 'branch', 'pushed to'
+    line = re.sub(r'\bbranch\b', '', line)
+    line = re.sub(r'\bpushed to\b', '', line)
+
+    # Remove commit counts and underscores
+    # Example: "1 new commit  _f/<branch>_ by <Name>" → "f/<branch> by <Name>"
+    line = re.sub(r'^\s*\d+ new commit[s]?\s+_(.*?)_\s+by\s+(\w+)', r'\1 by \2', line)
+
+    # Replace "Pull request opened by " and "Pull request merged by " with "PR by "
+    line = re.sub(r'Pull request (opened|merged) by\s+', 'PR by ', line)
+
+    # Remove specific substrings but keep the rest
+    line = re.sub(r'\*What type of PR is this\? \(check all applicable\)\*', '', line)
+
+    # Replace newline characters with spaces to consolidate multi-line entries
+    line = line.replace('\\n', ' ').replace('\n', ' ')
+
+    # Remove angle brackets
+    line = re.sub(r'[<>]', '', line)
+
+    # Remove multiple spaces
+    line = re.sub(r'\s+', ' ', line)
+
+    # Remove extra whitespace and trailing commas
+    line = line.rstrip(',').strip()
+
+    # Remove lines that have unnecessary content
+    line = re.sub(r'^\s*(Comment|Comments|Edit|Reopen|Close|Labels|Assignees|Reviewers)\s*$', '', line)
+
+    return line if line else None
+
+
+def benchmark_clean_line(input_dir, org_prefix, org_fallback_pattern, repeats=3):
+    """
+    Runs both clean_line implementations over every matching line in the input
+    files, checks they agree and prints their throughput.
+    """
+    lines = []
+    for json_file in slack_export.list_export_files(input_dir):
+        with slack_export.open_export_file(input_dir, json_file) as infile:
+            lines.extend(line for line in infile.read().splitlines()
+                         if any(keyword in line for keyword in slack_export.keywords))
+    if not lines:
+        print(f'No matching lines found in {input_dir}')
+        return
+
+    def reference(line):
+        return clean_line_reference(line, org_prefix, org_fallback_pattern)
+
+    slack_export.init_worker(org_prefix, org_fallback_pattern)
+    mismatches = [line for line in lines if slack_export.clean_line(line) != reference(line)]
+    for name, function in (('reference', reference), ('compiled', slack_export.clean_line)):
+        best = min(timeit.repeat(lambda: [function(line) for line in lines], number=1, repeat=repeats))
+        print(f'{name:<10} {len(lines) / best:12,.0f} lines/sec')
+    if mismatches:
+        print(f'{len(mismatches)} of {len(lines)} lines differ, for example: {mismatches[0]!r}')
+        raise SystemExit(1)
+    print(f'Outputs match on all {len(lines)} lines.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time clean_line against the original implementation on a Slack export and check both give the same output.")
+    parser.add_argument('--input_dir', default='./path/to/json/files', help='Directory containing the JSON files, or the export .zip')
+    parser.add_argument('--org_prefix', default='orgname/', help='Organization prefix to remove (e.g., "orgname/"). Set empty if none.')
+    parser.add_argument('--org_fallback_pattern', default=r'\[orgname\/[^]]+\] ', help='Regex pattern to remove org-specific fallback info. Set empty if none.')
+    parser.add_argument('--repeats', type=int, default=3, help='Timing runs per implementation, the best one is reported')
+    args = parser.parse_args()
+    benchmark_clean_line(args.input_dir, args.org_prefix, args.org_fallback_pattern, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from pyannote.core import Annotation, Segment
+
+from transcription_diarization import (
+    SAMPLE_RATE, PipelineMetrics, align_timestamps, align_words, diarize_audio, load_diarization_pipeline,
+    load_transcription_engine, prepare_audio, transcribe_audio, write_wav
+)
+
+
+def align_timestamps_reference(transcription_segments, diarization_result):
+    """
+    The original full-scan alignment, kept to check the indexed version against.
+    """
+    aligned_results = []
+    for t_segment in transcription_segments:
+        t_segment_obj = Segment(t_segment['start'], t_segment['end'])
+        overlapping_speakers = []
+        for d_segment, _, speaker in diarization_result.itertracks(yield_label=True):
+            if d_segment.intersects(t_segment_obj):
+                overlap = d_segment & t_segment_obj
+                overlapping_speakers.append((overlap.duration, speaker))
+        if overlapping_speakers:
+            selected_speaker = max(overlapping_speakers, key=lambda x: x[0])[1]
+        else:
+            selected_speaker = "Unknown"
+        aligned_results.append({
+            'start': t_segment['start'],
+            'end': t_segment['end'],
+            'speaker': selected_speaker,
+            'text': t_segment['text'].strip()
+        })
+    return aligned_results
+
+
+def generate_alignment_inputs(num_segments, num_speakers, long_turn=False, seed=0):
+    """
+    Generates Whisper-like segments and an overlapping diarization over the same
+    timeline. With long_turn, one extra turn spans the whole recording, like one
+    the diarization holds through background music or a constant hum.
+    """
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    for i in range(num_segments):
+        start = t + rng.uniform(0.0, 0.5)
+        end = start + rng.uniform(0.5, 8.0)
+        segment = {'id': i, 'start': round(start, 2), 'end': round(end, 2), 'text': f" segment {i}"}
+        # Ten evenly spaced words per segment for the word-level alignment
+        word_length = (segment['end'] - segment['start']) / 10
+        segment['words'] = [
+            {'word': f" w{i}_{j}", 'start': segment['start'] + j * word_length, 'end': segment['start'] + (j + 1) * word_length}
+            for j in range(10)
+        ]
+        segments.append(segment)
+        t = end
+
+    diarization = Annotation()
+    t = 0.0
+    while t < segments[-1]['end']:
+        start = max(0.0, t - rng.uniform(0.0, 1.0))  # Turns overlap a little, like crosstalk
+        end = start + rng.uniform(0.3, 20.0)
+        diarization[Segment(start, end)] = f"SPEAKER_{rng.randrange(num_speakers):02d}"
+        t = end
+    if long_turn:
+        diarization[Segment(0.0, segments[-1]['end'])] = f"SPEAKER_{num_speakers:02d}"
+    return segments, diarization
+
+
+def benchmark_alignment(num_segments, num_speakers, skip_reference):
+    for long_turn in (False, True):
+        segments, diarization = generate_alignment_inputs(num_segments, num_speakers, long_turn)
+        print(f"{len(segments)} segments, {len(diarization)} diarization turns" + (", one spanning the recording" if long_turn else ""))
+        benchmark_alignment_case(segments, diarization, skip_reference)
+
+
+def benchmark_alignment_case(segments, diarization, skip_reference):
+    start_time = time.perf_counter()
+    word_aligned = align_words(segments, diarization)
+    print(f"Word-level alignment of {len(segments) * 10} words: {time.perf_counter() - start_time:.3f}s, {len(word_aligned)} segments after splitting")
+
+    start_time = time.perf_counter()
+    aligned = align_timestamps(segments, diarization)
+    indexed_time = time.perf_counter() - start_time
+    print(f"Indexed alignment: {indexed_time:.3f}s")
+
+    if not skip_reference:
+        start_time = time.perf_counter()
+        expected = align_timestamps_reference(segments, diarization)
+        reference_time = time.perf_counter() - start_time
+        print(f"Full-scan alignment: {reference_time:.3f}s ({reference_time / indexed_time:.1f}x slower)")
+        if aligned != expected:
+            raise SystemExit("Indexed alignment does not match the full-scan alignment")
+        print("Outputs match.")
+
+
+def generate_synthetic_audio(duration, num_speakers, seed=0):
+    """
+    Generates tone/noise audio where each "speaker" is a harmonic tone at its own
+    pitch, with short pauses of background noise between turns. Returns the
+    audio and the ground-truth turns as an Annotation.
+    """
+    rng = np.random.default_rng(seed)
+    total_samples = int(duration * SAMPLE_RATE)
+    audio = (rng.standard_normal(total_samples) * 0.005).astype(np.float32)
+    turns = Annotation(uri="synthetic")
+
+    t = 0.0
+    while t < duration:
+        turn_length = min(rng.uniform(2.0, 10.0), duration - t)
+        speaker = int(rng.integers(num_speakers))
+        pitch = 110.0 * (1.5 ** speaker)
+        start, end = int(t * SAMPLE_RATE), int((t + turn_length) * SAMPLE_RATE)
+        timeline = np.arange(end - start) / SAMPLE_RATE
+        # A few harmonics with a syllable-rate envelope sound more voice-like than a pure tone
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4.0 * timeline)
+        tone = sum(np.sin(2 * np.pi * pitch * harmonic * timeline) / harmonic for harmonic in (1, 2, 3))
+        audio[start:end] += (0.2 * envelope * tone).astype(np.float32)
+        turns[Segment(t, t + turn_length)] = f"SPEAKER_{speaker:02d}"
+        t += turn_length + rng.uniform(0.2, 1.0)
+    return audio, turns
+
+
+def benchmark_pipeline(duration, num_speakers, engine_name, model_name, token, snapshot_dir, report_path, baseline_path, tolerance):
+    """
+    Runs the pipeline stages on generated audio with a small model on CPU and
+    writes a metrics report. The stub engine exercises everything but the
+    model. Without a Hugging Face token the generated turns stand in for
+    diarization. With a baseline report, stages that got slower than the
+    tolerance allows fail the benchmark.
+    """
+    audio, turns = generate_synthetic_audio(duration, num_speakers)
+    run_diarization = bool(token or snapshot_dir)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        audio_path = os.path.join(temp_dir, "synthetic.wav")
+        write_wav(audio, audio_path)
+
+        metrics = PipelineMetrics(audio_path, engine=engine_name, model=model_name, device="cpu", synthetic_duration=duration)
+        metrics.audio_duration = duration
+        with metrics.stage("conversion"):
+            decoded, _ = prepare_audio(audio_path, in_memory=True)
+        with metrics.stage("model_load"):
+            load_transcription_engine(engine_name, model_name, "cpu")
+            if run_diarization:
+                load_diarization_pipeline(token, "cpu", snapshot_dir)
+        with metrics.stage("transcription"):
+            _, segments = transcribe_audio(decoded, model_name, "cpu", options={'engine': engine_name})
+        if run_diarization:
+            with metrics.stage("diarization"):
+                turns = diarize_audio(decoded, token, num_speakers, "cpu", snapshot_dir)
+        with metrics.stage("alignment"):
+            align_timestamps(segments, turns)
+        metrics.write_report(report_path)
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as file:
+            baseline = {stage['stage']: stage for stage in json.load(file)['stages']}
+        regressions = []
+        for stage in metrics.stages:
+            previous = baseline.get(stage['stage'])
+            if previous and stage['wall_seconds'] > previous['wall_seconds'] * (1 + tolerance):
+                regressions.append(f"{stage['stage']}: {previous['wall_seconds']:.2f}s -> {stage['wall_seconds']:.2f}s")
+        if regressions:
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+# Commands that shouldn't pay for the heavy imports, and those imports
+STARTUP_COMMANDS = [["--help"], ["convert", "--help"], ["transcribe", "--help"], ["align", "--help"], ["run", "--help"]]
+HEAVY_MODULES = ("torch", "whisper", "pyannote", "ffmpeg", "numpy")
+
+
+def benchmark_startup(target_seconds, runs):
+    """
+    Times the lightweight CLI paths in fresh interpreters against a startup
+    target, and checks none of them imports a heavy module.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcription_diarization.py")
+    failures = []
+    for command in STARTUP_COMMANDS:
+        timings = []
+        for _ in range(runs):
+            start_time = time.perf_counter()
+            subprocess.run([sys.executable, script, *command], check=True, stdout=subprocess.DEVNULL)
+            timings.append(time.perf_counter() - start_time)
+        median = statistics.median(timings)
+
+        # -X importtime lists every imported module on stderr
+        imports = subprocess.run([sys.executable, "-X", "importtime", script, *command], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+        imported = {line.rsplit("|", 1)[-1].strip().split(".")[0] for line in imports.splitlines() if "|" in line}
+        heavy = sorted(imported.intersection(HEAVY_MODULES))
+
+        print(f"{' '.join(command):<20} {median * 1000:7.1f}ms" + (f"  imports {', '.join(heavy)}" if heavy else ""))
+        if median > target_seconds or heavy:
+            failures.append(" ".join(command))
+    if failures:
+        print(f"Over the {target_seconds * 1000:.0f}ms startup target or importing heavy modules: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"All commands within the {target_seconds * 1000:.0f}ms startup target.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the transcription/diarization pipeline.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    alignment_parser = subparsers.add_parser("alignment", help="Benchmark speaker alignment on synthetic segments")
+    alignment_parser.add_argument("--segments", type=int, default=10000, help="Number of transcript segments to align")
+    alignment_parser.add_argument("--speakers", type=int, default=4, help="Number of distinct speakers")
+    alignment_parser.add_argument("--skip_reference", action="store_true", default=False, help="Don't run the slow full-scan alignment")
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="Benchmark the pipeline stages on generated tone/noise audio on CPU")
+    pipeline_parser.add_argument("--duration", type=float, default=120.0, help="Seconds of audio to generate")
+    pipeline_parser.add_argument("--speakers", type=int, default=2, help="Number of distinct speakers")
+    pipeline_parser.add_argument("--engine", type=str, default="whisper", help="Transcription engine to benchmark (whisper, faster-whisper or stub)")
+    pipeline_parser.add_argument("--model", type=str, default="tiny", help="Whisper model to use")
+    pipeline_parser.add_argument("--token", type=str, default=None, help="Hugging Face access token, to include real diarization")
+    pipeline_parser.add_argument("--diarization_snapshot", type=str, default=None, help="Local diarization model snapshot from download_model.py, to include real diarization offline")
+    pipeline_parser.add_argument("--report", type=str, default="benchmark_metrics.json", help="Where to write the metrics report")
+    pipeline_parser.add_argument("--baseline", type=str, default=None, help="Earlier report to check for regressions against")
+    pipeline_parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown per stage relative to the baseline")
+
+    startup_parser = subparsers.add_parser("startup", help="Check the CLI's lightweight paths start without the heavy imports")
+    startup_parser.add_argument("--target", type=float, default=0.5, help="Startup time target in seconds")
+    startup_parser.add_argument("--runs", type=int, default=5, help="Runs per command, the median is compared to the target")
+
+    args = parser.parse_args()
+    if args.benchmark == "alignment":
+        benchmark_alignment(args.segments, args.speakers, args.skip_reference)
+    elif args.benchmark == "startup":
+        benchmark_startup(args.target, args.runs)
+    else:
+        benchmark_pipeline(args.duration, args.speakers, args.engine, args.model, args.token, args.diarization_snapshot, args.report, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
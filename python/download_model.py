@@ -4,8 +4,14 @@ from huggingface_hub import snapshot_download
 model_id = 'pyannote/speaker-diarization-3.1'
 local_dir = './pyannote_speaker_diarization_3.1'
 
+# The pipeline's config.yaml refers to these models by ID, download them too so
+# transcription_diarization.py --diarization_snapshot can load everything offline
+dependency_model_ids = ['pyannote/segmentation-3.0', 'pyannote/wespeaker-voxceleb-resnet34-LM']
+
 # Your Hugging Face access token
 token = ''
 
 # Download the model and save it to the specified directory
 snapshot_download(repo_id=model_id, cache_dir=local_dir, use_auth_token=token)
+for dependency_model_id in dependency_model_ids:
+    snapshot_download(repo_id=dependency_model_id, cache_dir=local_dir, use_auth_token=token)
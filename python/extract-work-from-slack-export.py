@@ -1,108 +1,202 @@
 import os
 import re
 import argparse
-
-parser = argparse.ArgumentParser(description="Clean JSON Slack export lines for LLM ingestion.")
-parser.add_argument('--input_dir', default='./path/to/json/files', help='Directory containing the JSON files')
-parser.add_argument('--output_file', default='cleaned_consolidated_output.txt', help='Output file name')
-parser.add_argument('--org_prefix', default='orgname/', help='Organization prefix to remove (e.g., "orgname/"). Set empty if none.')
-parser.add_argument('--org_fallback_pattern', default=r'\[orgname\/[^]]+\] ', help='Regex pattern to remove org-specific fallback info. Set empty if none.')
-args = parser.parse_args()
-
-input_dir = args.input_dir
-output_file = args.output_file
-org_prefix = args.org_prefix
-org_fallback_pattern = args.org_fallback_pattern
+import hashlib
+import io
+import json
+import zipfile
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 # Define the keywords to search for in lines
 keywords = ['"fallback":', '"text":', '"title":', '"pretext":']
 
+# Message and attachment fields read by the json parser, in the keywords' order
+message_fields = ('fallback', 'text', 'title', 'pretext')
+
 # Define the patterns to exclude
 exclude_patterns = ['dependabot[bot]', 'Bump']
 
-def clean_line(line):
-    """Clean individual line based on specific rules."""
-    # Remove escape characters and quotation marks
-    line = line.replace('\\/', '/').replace('"', '')
+def replace_github_url(match):
+    url_part = match.group(1)
+    display_part = match.group(2)
+    if 'issues' in url_part:
+        # For issue URLs, keep both parts
+        # Remove issue number from url_part
+        url_part = ISSUE_NUMBER_PATTERN.sub(r'\1', url_part)
+        return url_part + '|' + display_part
+    else:
+        # For other URLs, keep only the URL part before the '|'
+        return url_part
 
-    # Simplify URLs by removing the "https://github.com" part
-    # Modify the substitution to handle 'issues' differently
-    def replace_github_url(match):
-        url_part = match.group(1)
-        display_part = match.group(2)
-        if 'issues' in url_part:
-            # For issue URLs, keep both parts
-            # Remove issue number from url_part
-            url_part = re.sub(r'(/issues)/\d+', r'\1', url_part)
-            return url_part + '|' + display_part
-        else:
-            # For other URLs, keep only the URL part before the '|'
-            return url_part
+ISSUE_NUMBER_PATTERN = re.compile(r'(/issues)/\d+')
 
-    line = re.sub(r'<https:\/\/github\.com\/([^|>]+)\|([^>]+)>', replace_github_url, line)
-    line = re.sub(r'https:\/\/github\.com\/', '', line)
+# Lines that are dropped entirely when nothing else is left on them
+UNNECESSARY_LINES = {'Comment', 'Comments', 'Edit', 'Reopen', 'Close', 'Labels', 'Assignees', 'Reviewers'}
 
-    # Remove backticks around GitHub links
-    line = re.sub(r'`([^`]+)`', r'\1', line)
+def build_clean_rules(org_prefix, org_fallback_pattern):
+    """
+    Compiles the cleaning rules once, in the order they are applied. Each rule is
+    (guard, function); a rule is skipped when its guard substring isn't in the
+    line, since its pattern couldn't match then. Rules without a guard always run.
+    """
+    def sub_rule(pattern, replacement=''):
+        compiled = re.compile(pattern)
+        return lambda line: compiled.sub(replacement, line)
 
-    # Remove asterisks
-    line = line.replace('*', '')
-
-    # Remove the word "commit" and commit IDs
-    line = re.sub(r'commit\/[a-f0-9]{40}\|', '', line)
-    line = re.sub(r'[a-f0-9]{7,40}', '', line)
-    # Remove trailing "/commit/"
-    line = re.sub(r'/commit/', '', line)
+    def remove_rule(substring):
+        return lambda line: line.replace(substring, '')
 
+    rules = [
+        # Simplify URLs by removing the "https://github.com" part
+        # Issue URLs keep both parts, other URLs only the part before the '|'
+        ('<https://github.com/', sub_rule(r'<https:\/\/github\.com\/([^|>]+)\|([^>]+)>', replace_github_url)),
+        ('https://github.com/', remove_rule('https://github.com/')),
+        # Remove backticks around GitHub links
+        ('`', sub_rule(r'`([^`]+)`', r'\1')),
+        # Remove asterisks
+        ('*', remove_rule('*')),
+        # Remove the word "commit" and commit IDs
+        ('commit/', sub_rule(r'commit\/[a-f0-9]{40}\|')),
+        (None, sub_rule(r'[a-f0-9]{7,40}')),
+        # Remove trailing "/commit/"
+        ('/commit/', remove_rule('/commit/')),
+    ]
     # Remove org-specific fallback line if pattern is provided and not empty
     if org_fallback_pattern.strip():
-        line = re.sub(org_fallback_pattern, '', line)
-
+        rules.append((None, sub_rule(org_fallback_pattern)))
     # Remove org prefix from repository paths if provided and not empty
     if org_prefix.strip():
-        line = re.sub(r'\b' + re.escape(org_prefix), '', line)
-
-    # Remove "/compare/..." from "pretext" lines
-    line = re.sub(r'/compare/\.\.\.', '', line)
-
-    # Remove the labels "fallback:", "text:", "title:", and "pretext:"
-    line = re.sub(r'^\s*(fallback:|text:|title:|pretext:)\s*', '', line)
+        rules.append((org_prefix, sub_rule(r'\b' + re.escape(org_prefix))))
+    rules += [
+        # Remove "/compare/..." from "pretext" lines
+        ('/compare/...', remove_rule('/compare/...')),
+        # Remove the labels "fallback:", "text:", "title:", and "pretext:"
+        (':', sub_rule(r'^\s*(fallback:|text:|title:|pretext:)\s*')),
+        # Remove unnecessary labels like 'branch', 'pushed to'
+        (None, sub_rule(r'\b(?:branch|pushed to)\b')),
+        # Remove commit counts and underscores
+        # Example: "1 new commit  _f/<branch>_ by <Name>" → "f/<branch> by <Name>"
+        (' new commit', sub_rule(r'^\s*\d+ new commit[s]?\s+_(.*?)_\s+by\s+(\w+)', r'\1 by \2')),
+        # Replace "Pull request opened by " and "Pull request merged by " with "PR by "
+        ('Pull request ', sub_rule(r'Pull request (opened|merged) by\s+', 'PR by ')),
+        # "*What type of PR is this?*" needs no rule of its own, the asterisks it
+        # would match on are already gone
+    ]
+    return rules
 
-    # Remove unnecessary labels like 'branch', 'pushed to'
-    line = re.sub(r'\bbranch\b', '', line)
-    line = re.sub(r'\bpushed to\b', '', line)
+# Compiled rules for clean_line, built in main() and in each worker process
+clean_rules = []
 
-    # Remove commit counts and underscores
-    # Example: "1 new commit  _f/<branch>_ by <Name>" → "f/<branch> by <Name>"
-    line = re.sub(r'^\s*\d+ new commit[s]?\s+_(.*?)_\s+by\s+(\w+)', r'\1 by \2', line)
+# Removes angle brackets in one pass
+ANGLE_BRACKETS = str.maketrans('', '', '<>')
+WHITESPACE_PATTERN = re.compile(r'\s+')
 
-    # Replace "Pull request opened by " and "Pull request merged by " with "PR by "
-    line = re.sub(r'Pull request (opened|merged) by\s+', 'PR by ', line)
+def clean_line(line):
+    """Clean individual line based on specific rules."""
+    # Remove escape characters and quotation marks
+    line = line.replace('\\/', '/').replace('"', '')
 
-    # Remove specific substrings but keep the rest
-    line = re.sub(r'\*What type of PR is this\? \(check all applicable\)\*', '', line)
+    for guard, rule in clean_rules:
+        if guard is None or guard in line:
+            line = rule(line)
 
     # Replace newline characters with spaces to consolidate multi-line entries
     line = line.replace('\\n', ' ').replace('\n', ' ')
 
     # Remove angle brackets
-    line = re.sub(r'[<>]', '', line)
+    line = line.translate(ANGLE_BRACKETS)
 
     # Remove multiple spaces
-    line = re.sub(r'\s+', ' ', line)
+    line = WHITESPACE_PATTERN.sub(' ', line)
 
     # Remove extra whitespace and trailing commas
     line = line.rstrip(',').strip()
 
     # Remove lines that have unnecessary content
-    line = re.sub(r'^\s*(Comment|Comments|Edit|Reopen|Close|Labels|Assignees|Reviewers)\s*$', '', line)
+    if line in UNNECESSARY_LINES:
+        line = ''
 
     return line if line else None
 
-def extract_relevant_lines(filename, content):
+def iter_json_array(infile, chunk_size=65536):
+    """
+    Yields the elements of the top-level JSON array in infile one at a time,
+    reading it in chunks, so only the current message is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    started = False
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer and not eof:
+            chunk = infile.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        if not started:
+            if not buffer:
+                return  # Empty file
+            if not buffer.startswith('['):
+                raise ValueError(f'{infile.name} does not contain a JSON array')
+            buffer = buffer[1:]
+            started = True
+        elif not buffer:
+            raise ValueError(f'{infile.name} ends before its JSON array is closed')
+        elif buffer.startswith(']'):
+            return
+        elif buffer.startswith(','):
+            buffer = buffer[1:]
+        else:
+            try:
+                element, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # An element running up to the end of the buffer may be cut off, so read on
+            if end is None or (end == len(buffer) and not eof):
+                chunk = infile.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield element
+            buffer = buffer[end:]
+
+def iter_message_lines(infile):
+    """
+    Streams the messages in a channel-day JSON file and yields their fields and
+    those of their attachments as '"field": value' lines, the same shape
+    extract_relevant_lines sees in the raw text.
+
+    The output differs from --parser lines wherever the raw text carries JSON
+    escapes or nested fields:
+    - Values are decoded, so escaped quotes are dropped with the other quotes
+      rather than leaving backslashes, and \\uXXXX escapes become characters.
+    - Newlines are real, so rules anchored at a word boundary also match right
+      after a line break, e.g. the org prefix in "...\\norgname/repo".
+    - Only the message's and its attachments' own fields are read, not the
+      "text" fields nested in blocks, which the lines mode picks up too.
+    """
+    def field_lines(item):
+        for key, value in item.items():
+            if key in message_fields and isinstance(value, str):
+                yield f'"{key}": {value}'
+            elif key == 'attachments' and isinstance(value, list):
+                for attachment in value:
+                    if isinstance(attachment, dict):
+                        yield from field_lines(attachment)
+
+    for message in iter_json_array(infile):
+        if isinstance(message, dict):
+            yield from field_lines(message)
+
+def extract_relevant_lines(filename, lines):
     extracted_lines = []
     previous_line = None  # Initialize previous_line to track duplicates
-    for line in content.splitlines():
+    for line in lines:
         # Check if the line contains any of the keywords and not any exclude patterns
         if any(keyword in line for keyword in keywords) and not any(pattern in line for pattern in exclude_patterns):
             # Special handling for "text": lines to remove GitHub link up to the hyphen
@@ -125,23 +219,317 @@ def extract_relevant_lines(filename, content):
                     previous_line = cleaned_line  # Update previous_line
     return extracted_lines
 
-# Open the output file in write mode with UTF-8 encoding
-with open(output_file, 'w', encoding='utf-8') as outfile:
-    # Iterate over all JSON files in the directory
-    for json_file in os.listdir(input_dir):
-        if json_file.endswith('.json'):
-            file_path = os.path.join(input_dir, json_file)
-            with open(file_path, 'r', encoding='utf-8') as infile:
-                content = infile.read()
-                # Write the filename (without extension) to the output file
-                outfile.write(f'{os.path.splitext(json_file)[0]}\n')
-                # Extract relevant lines from the JSON content
-                relevant_lines = extract_relevant_lines(json_file, content)
-                # Write the extracted lines to the output file
-                for line in relevant_lines:
-                    outfile.write(f'{line}\n')
-                # Add a newline to separate content from different files if there were relevant lines
-                if relevant_lines:
-                    outfile.write('\n')
-
-print(f'Extraction and cleaning complete. Cleaned consolidated output saved to {output_file}')
+def init_worker(org_prefix, org_fallback_pattern):
+    """Compiles the cleaning rules once per worker process."""
+    global clean_rules
+    clean_rules = build_clean_rules(org_prefix, org_fallback_pattern)
+
+# Open export zips by (process id, path), kept open so each member read doesn't re-read the zip's directory.
+# Forked workers inherit the parent's entries, but a ZipFile shares its file offset with every copy, so
+# each process has to open its own
+open_zips = {}
+
+def get_zip(zip_path):
+    key = (os.getpid(), zip_path)
+    if key not in open_zips:
+        open_zips[key] = zipfile.ZipFile(zip_path)
+    return open_zips[key]
+
+def list_export_files(input_path):
+    """
+    Returns the names of the JSON files to extract, in output order. A directory
+    holds one channel's day files, named YYYY-MM-DD.json, so sorting by name puts
+    them in date order. In an export zip the day files are channel/YYYY-MM-DD.json
+    members, which sort by channel, then date; the workspace-level files at the
+    zip's root (users.json, channels.json, ...) aren't messages and are skipped.
+    """
+    if zipfile.is_zipfile(input_path):
+        return sorted(name for name in get_zip(input_path).namelist()
+                      if name.endswith('.json') and '/' in name.strip('/'))
+    return sorted(json_file for json_file in os.listdir(input_path) if json_file.endswith('.json'))
+
+def open_export_file(input_path, name):
+    """Opens a JSON file from the export directory, or streams it out of the export zip."""
+    if os.path.isdir(input_path):
+        return open(os.path.join(input_path, name), 'r', encoding='utf-8')
+    return io.TextIOWrapper(get_zip(input_path).open(name), encoding='utf-8')
+
+def process_file(name, input_path, parser_mode):
+    """Extracts the cleaned lines from one JSON file."""
+    with open_export_file(input_path, name) as infile:
+        if parser_mode == 'json':
+            return extract_relevant_lines(name, iter_message_lines(infile))
+        return extract_relevant_lines(name, infile.read().splitlines())
+
+def hash_file(file_path, block_size=1 << 20):
+    """Returns the SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def options_fingerprint(args):
+    """
+    Hashes everything besides the input that changes a file's cleaned lines: the
+    cleaning options and this script itself, so editing a rule invalidates the cache.
+    """
+    with open(os.path.abspath(__file__), 'rb') as file:
+        script_hash = hashlib.sha256(file.read()).hexdigest()
+    options = {'parser': args.parser, 'org_prefix': args.org_prefix,
+               'org_fallback_pattern': args.org_fallback_pattern, 'script': script_hash}
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode('utf-8')).hexdigest()
+
+def load_manifest(manifest_path, fingerprint):
+    """Returns the manifest's file entries, or none if it was made with other options."""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+    if manifest.get('fingerprint') != fingerprint:
+        print('Cleaning options or script changed since the last run, re-extracting every file')
+        return {}
+    return manifest['files']
+
+def save_manifest(manifest_path, fingerprint, entries):
+    # Write to a temporary file first so a crash never leaves a truncated manifest
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump({'fingerprint': fingerprint, 'files': entries}, file, indent=2)
+    os.replace(temp_path, manifest_path)
+
+def check_unchanged(input_path, name, entry):
+    """
+    Compares a file against its manifest entry. Size and mtime matching is enough;
+    otherwise the content hash decides, so a touched but identical file is still
+    reused. Zip members are compared by the size, timestamp and CRC-32 stored in
+    the zip, without decompressing them. Returns the file's current entry and
+    whether it is unchanged.
+    """
+    if not os.path.isdir(input_path):
+        info = get_zip(input_path).getinfo(name)
+        current = {'size': info.file_size, 'date_time': list(info.date_time), 'crc32': info.CRC}
+        return current, current == entry
+    file_path = os.path.join(input_path, name)
+    stat = os.stat(file_path)
+    current = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if entry and entry['size'] == current['size'] and entry['mtime_ns'] == current['mtime_ns']:
+        return entry, True
+    current['sha256'] = hash_file(file_path)
+    return current, bool(entry) and entry['sha256'] == current['sha256']
+
+def read_piece(piece_path):
+    with open(piece_path, 'r', encoding='utf-8') as file:
+        return file.read().splitlines()
+
+def write_piece(piece_path, lines):
+    os.makedirs(os.path.dirname(piece_path), exist_ok=True)
+    temp_path = piece_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.writelines(f'{line}\n' for line in lines)
+    os.replace(temp_path, piece_path)
+
+# Rough estimate of the bytes per token of English text for LLM tokenizers
+BYTES_PER_TOKEN = 4
+
+class LineDeduplicator:
+    """
+    Remembers the lines written so far across the whole export, by a blake2b
+    digest of the normalized line. The exact mode keeps every digest in a set;
+    the approximate mode uses a Bloom filter of a fixed size, which can
+    occasionally drop a line it hasn't seen but never grows.
+    """
+
+    def __init__(self, mode, memory_mb=64, num_hashes=7):
+        self.mode = mode
+        self.lines_removed = 0
+        self.bytes_removed = 0
+        if mode == 'exact':
+            self.seen = set()
+        else:
+            self.num_bits = memory_mb * 1024 * 1024 * 8
+            self.num_hashes = num_hashes
+            self.bits = bytearray(self.num_bits // 8)
+
+    def is_duplicate(self, line):
+        """Returns whether an equivalent line was seen before, and remembers this one."""
+        normalized = ' '.join(line.casefold().split())
+        digest = hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+        if self.mode == 'exact':
+            duplicate = digest in self.seen
+            self.seen.add(digest)
+        else:
+            # Double hashing: the k bit positions are h1 + i * h2
+            h1 = int.from_bytes(digest[:8], 'little')
+            h2 = int.from_bytes(digest[8:], 'little') | 1
+            duplicate = True
+            for i in range(self.num_hashes):
+                position = (h1 + i * h2) % self.num_bits
+                byte, bit = divmod(position, 8)
+                if not self.bits[byte] & (1 << bit):
+                    duplicate = False
+                    self.bits[byte] |= 1 << bit
+        if duplicate:
+            self.lines_removed += 1
+            self.bytes_removed += len(line.encode('utf-8')) + 1
+        return duplicate
+
+def format_block(header, lines):
+    """Formats one file's lines for the output, the same way for the consolidated file and shards."""
+    # The filename (without extension), then the extracted lines
+    block = f'{header}\n' + ''.join(f'{line}\n' for line in lines)
+    # Add a newline to separate content from different files if there were relevant lines
+    if lines:
+        block += '\n'
+    return block
+
+class ShardWriter:
+    """
+    Streams file blocks into numbered shard files capped by size, and writes an
+    index.json listing each shard's blocks and size. Tokens are estimated at 4
+    bytes each, so a token cap is a byte cap of 4x the tokens. A block that
+    doesn't fit in the current shard starts the next one, and only a block too
+    big for a shard of its own is split between lines, with its header repeated.
+    The shards concatenated in order equal the consolidated output, except for
+    those repeated headers (and the blank line ending each part of a split block).
+    """
+
+    def __init__(self, shard_dir, max_bytes=None, max_tokens=None):
+        self.shard_dir = shard_dir
+        caps = [cap for cap in (max_bytes, max_tokens * BYTES_PER_TOKEN if max_tokens else None) if cap]
+        self.limit = min(caps) if caps else None
+        self.shards = []
+        self.outfile = None
+        os.makedirs(shard_dir, exist_ok=True)
+
+    def write_block(self, header, lines):
+        header_size = len(header.encode('utf-8')) + 1
+        line_sizes = [len(line.encode('utf-8')) + 1 for line in lines]
+        block_size = header_size + sum(line_sizes) + (1 if lines else 0)
+        if self.outfile and self.limit and self.shards[-1]['bytes'] + block_size > self.limit:
+            self.close_shard()
+        if not self.limit or block_size <= self.limit or not lines:
+            self.append(header, lines, block_size)
+            return
+
+        part, part_size = [], header_size + 1
+        for line, line_size in zip(lines, line_sizes):
+            if part and part_size + line_size > self.limit:
+                self.append(header, part, part_size)
+                self.close_shard()
+                part, part_size = [], header_size + 1
+            part.append(line)
+            part_size += line_size
+        self.append(header, part, part_size)
+
+    def append(self, header, lines, size):
+        if not self.outfile:
+            name = f'shard_{len(self.shards):05d}.txt'
+            # newline='' keeps '\n' as one byte on Windows too, so the sizes in the index and the cap hold
+            self.outfile = open(os.path.join(self.shard_dir, name), 'w', encoding='utf-8', newline='')
+            self.shards.append({'file': name, 'bytes': 0, 'estimated_tokens': 0, 'blocks': []})
+        self.outfile.write(format_block(header, lines))
+        shard = self.shards[-1]
+        shard['bytes'] += size
+        shard['estimated_tokens'] = -(-shard['bytes'] // BYTES_PER_TOKEN)
+        shard['blocks'].append({'name': header, 'lines': len(lines)})
+
+    def close_shard(self):
+        self.outfile.close()
+        self.outfile = None
+
+    def close(self):
+        if self.outfile:
+            self.close_shard()
+        index_path = os.path.join(self.shard_dir, 'index.json')
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'max_bytes': self.limit, 'bytes_per_token': BYTES_PER_TOKEN, 'shards': self.shards}, file, indent=2)
+        os.replace(index_path + '.tmp', index_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean JSON Slack export lines for LLM ingestion.")
+    parser.add_argument('--input_dir', default='./path/to/json/files', help='Directory containing the JSON files, or the export .zip, read without unpacking it')
+    parser.add_argument('--output_file', default='cleaned_consolidated_output.txt', help='Output file name')
+    parser.add_argument('--org_prefix', default='orgname/', help='Organization prefix to remove (e.g., "orgname/"). Set empty if none.')
+    parser.add_argument('--org_fallback_pattern', default=r'\[orgname\/[^]]+\] ', help='Regex pattern to remove org-specific fallback info. Set empty if none.')
+    parser.add_argument('--parser', choices=['lines', 'json'], default='lines', help='How to read the JSON files: scan raw text lines for the keywords, or parse the messages and attachments. json decodes escapes and skips block text, so its output differs where those occur')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of processes cleaning files in parallel')
+    parser.add_argument('--incremental', action='store_true', default=False, help='Only re-extract files that changed since the last run, reusing the cached lines of the others')
+    parser.add_argument('--cache_dir', default=None, help='Where --incremental keeps its manifest and cleaned lines per file (default: <output_file>.cache)')
+    parser.add_argument('--dedup', choices=['none', 'exact', 'approx'], default='none', help='Drop lines already written anywhere earlier in the export: exactly, or approximately with a fixed-size Bloom filter')
+    parser.add_argument('--dedup_memory_mb', type=int, default=64, help='Memory budget of the Bloom filter for --dedup approx')
+    parser.add_argument('--shard_dir', default=None, help='Write the output as size-capped shards with an index.json into this directory, instead of one output file')
+    parser.add_argument('--shard_max_tokens', type=int, default=None, help='Estimated token cap per shard')
+    parser.add_argument('--shard_max_bytes', type=int, default=None, help='Byte cap per shard')
+    args = parser.parse_args()
+
+    input_dir = args.input_dir
+    output_file = args.output_file
+
+    init_worker(args.org_prefix, args.org_fallback_pattern)
+
+    json_files = list_export_files(input_dir)
+
+    # With --incremental, unchanged files are read back from their cached pieces
+    cached = set()
+    if args.incremental:
+        cache_dir = args.cache_dir or output_file + '.cache'
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest_path = os.path.join(cache_dir, 'manifest.json')
+        fingerprint = options_fingerprint(args)
+        previous = load_manifest(manifest_path, fingerprint)
+        entries = {}
+        for json_file in json_files:
+            entries[json_file], unchanged = check_unchanged(input_dir, json_file, previous.get(json_file))
+            if unchanged and os.path.exists(os.path.join(cache_dir, json_file + '.txt')):
+                cached.add(json_file)
+        print(f'{len(cached)} of {len(json_files)} files unchanged since the last run')
+    deduplicator = LineDeduplicator(args.dedup, args.dedup_memory_mb) if args.dedup != 'none' else None
+
+    changed_files = [json_file for json_file in json_files if json_file not in cached]
+
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker, initargs=(args.org_prefix, args.org_fallback_pattern)) if args.jobs > 1 else nullcontext() as executor:
+        if executor:
+            # map() hands back results in submission order, so this process writes them in date order
+            # while the workers run ahead
+            results = executor.map(process_file, changed_files, repeat(input_dir), repeat(args.parser), chunksize=max(1, len(changed_files) // (args.jobs * 8)))
+        else:
+            results = map(process_file, changed_files, repeat(input_dir), repeat(args.parser))
+
+        writer = ShardWriter(args.shard_dir, args.shard_max_bytes, args.shard_max_tokens) if args.shard_dir else None
+        # Open the output file in write mode with UTF-8 encoding
+        with nullcontext() if writer else open(output_file, 'w', encoding='utf-8') as outfile:
+            for json_file in json_files:
+                if json_file in cached:
+                    relevant_lines = read_piece(os.path.join(cache_dir, json_file + '.txt'))
+                else:
+                    relevant_lines = next(results)
+                    if args.incremental:
+                        write_piece(os.path.join(cache_dir, json_file + '.txt'), relevant_lines)
+                if deduplicator:
+                    relevant_lines = [line for line in relevant_lines if not deduplicator.is_duplicate(line)]
+                header = os.path.splitext(json_file)[0]
+                if writer:
+                    writer.write_block(header, relevant_lines)
+                else:
+                    outfile.write(format_block(header, relevant_lines))
+        if writer:
+            writer.close()
+
+    if args.incremental:
+        # Drop the pieces of files that are gone from the export
+        for json_file in set(previous) - set(entries):
+            piece_path = os.path.join(cache_dir, json_file + '.txt')
+            if os.path.exists(piece_path):
+                os.remove(piece_path)
+        save_manifest(manifest_path, fingerprint, entries)
+
+    if deduplicator:
+        print(f'Deduplication removed {deduplicator.lines_removed} lines ({deduplicator.bytes_removed} bytes)')
+    if writer:
+        print(f'Extraction and cleaning complete. {len(writer.shards)} shards and their index saved to {args.shard_dir}')
+    else:
+        print(f'Extraction and cleaning complete. Cleaned consolidated output saved to {output_file}')
+
+if __name__ == '__main__':
+    main()
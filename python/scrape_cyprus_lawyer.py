@@ -1,16 +1,107 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.common.exceptions import StaleElementReferenceException
-import datetime
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
 import time
 import csv
 from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urljoin, urlsplit
+
+# Selenium is only needed by the selenium engine, and requests and lxml only by
+# the http engine, so each is imported where it's used
+
+BASE_URL = 'https://www.cyprusbar.org'
+MEMBERS_PATH = '/CypriotAdvocateMembersPage'
+
+CSV_HEADER = [
+    'Full Name', 'Alternative Name', 'Greek Name', 'Phone', 'Fax', 'Court Deposit Box', 'Province',
+    'Address', 'Postal Code', 'Email', 'URL', 'Mobile'
+]
+
+def csv_row(full_data):
+    """Orders a scraped record's fields as in CSV_HEADER."""
+    return [
+        full_data['full_name'], full_data['alternative_name'], full_data['greek_name'], full_data['phone'],
+        full_data['fax'], full_data['court_box'], full_data['province'], full_data['address'],
+        full_data['postal_code'], full_data['email'], full_data['url'], full_data['mobile']
+    ]
+
+class Checkpoint:
+    """
+    One worker's progress: the rows scraped on each of its pages, by their index
+    on the page, and the pages it completed. The JSON file is rewritten atomically
+    after every record, so a crash loses at most the row in flight.
+    """
+
+    def __init__(self, path, pages=None, completed=()):
+        self.path = path
+        self.pages = pages or {}
+        self.completed = set(completed)
+
+    def has_row(self, page, index):
+        return index in self.pages.get(page, {})
+
+    def add_row(self, page, index, row):
+        self.pages.setdefault(page, {})[index] = row
+        self.save()
+
+    def complete_page(self, page, num_rows):
+        """Marks a page done if all of its rows are in, so a resume retries pages with failed rows."""
+        if len(self.pages.get(page, {})) >= num_rows:
+            self.completed.add(page)
+            self.save()
+
+    def save(self):
+        data = {
+            'completed': sorted(self.completed),
+            'pages': {str(page): {str(index): row for index, row in rows.items()} for page, rows in self.pages.items()}
+        }
+        # Write to a temporary file first so a crash never leaves a truncated checkpoint
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+def load_checkpoints(checkpoint_dir):
+    """Combines every worker checkpoint in the directory into the rows per page and the completed pages."""
+    pages, completed = {}, set()
+    for path in sorted(glob.glob(os.path.join(checkpoint_dir, 'pages_*.json'))):
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        completed.update(data['completed'])
+        for page, rows in data['pages'].items():
+            pages.setdefault(int(page), {}).update({int(index): row for index, row in rows.items()})
+    return pages, completed
+
+def merge_checkpoints(checkpoint_dir, output_csv):
+    """
+    Writes every scraped row from the checkpoints into one CSV in page and row
+    order, dropping rows that were scraped more than once. Returns the number of rows written.
+    """
+    pages, _ = load_checkpoints(checkpoint_dir)
+    seen = set()
+    with open(output_csv, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        for page in sorted(pages):
+            for index in sorted(pages[page]):
+                row = tuple(pages[page][index])
+                if row not in seen:
+                    seen.add(row)
+                    writer.writerow(row)
+    return len(seen)
 
 # Function to handle scraping a range of pages
-def scrape_pages(start_page, end_page, file_suffix):
+def scrape_pages(start_page, end_page, checkpoint, detail_tabs=0):
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import StaleElementReferenceException
+
     # Initialize WebDriver for each thread
     driver = webdriver.Chrome()
 
@@ -18,15 +109,7 @@ def scrape_pages(start_page, end_page, file_suffix):
     wait = WebDriverWait(driver, 10)
 
     # Open the Cypriot Lawyers page
-    driver.get('https://www.cyprusbar.org/CypriotAdvocateMembersPage')
-
-    filename = f'lawyers_data_{file_suffix}.csv'
-    with open(filename, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            'Full Name', 'Alternative Name', 'Greek Name', 'Phone', 'Fax', 'Court Deposit Box', 'Province', 
-            'Address', 'Postal Code', 'Email', 'URL', 'Mobile'
-        ])
+    driver.get(BASE_URL + MEMBERS_PATH)
 
     def extract_lawyer_data():
         """
@@ -188,6 +271,106 @@ def scrape_pages(start_page, end_page, file_suffix):
         except Exception as e:
             print(f"Failed to click on details button: {str(e)}")
             
+    def save_row(page, index, full_data):
+        checkpoint.add_row(page, index, csv_row(full_data))
+
+    def open_detail_tabs(count):
+        """
+        Opens named tabs for the details pages next to the grid's tab, and returns
+        their (name, window handle) pairs.
+        """
+        grid_window = driver.current_window_handle
+        for n in range(count):
+            driver.execute_script("window.open('about:blank', arguments[0]);", f'details{n}')
+        tabs = {}
+        for handle in driver.window_handles:
+            if handle != grid_window:
+                driver.switch_to.window(handle)
+                tabs[driver.execute_script("return window.name;")] = handle
+        driver.switch_to.window(grid_window)
+        return [(f'details{n}', tabs[f'details{n}']) for n in range(count)]
+
+    def open_details_in_tab(details_button, tab_name):
+        """
+        Opens a row's details in the named tab. A postback link's href is parsed
+        and __doPostBack called directly while the grid's form targets the tab,
+        since clicking a javascript: link only runs it after the click returns,
+        when the form's target would already be restored. A plain link just gets
+        the tab as its target. The grid's tab doesn't navigate.
+        """
+        postback = POSTBACK_PATTERN.search(details_button.get_attribute('href') or '')
+        if postback:
+            driver.execute_script("""
+                var form = document.forms[0];
+                var previousTarget = form.target;
+                form.target = arguments[0];
+                try {
+                    __doPostBack(arguments[1], arguments[2]);
+                } finally {
+                    form.target = previousTarget;
+                }
+            """, tab_name, *postback.groups())
+        else:
+            driver.execute_script("arguments[0].target = arguments[1]; arguments[0].click();", details_button, tab_name)
+
+    def iterate_with_detail_tabs(start_page, end_page):
+        """
+        Iterates through the table pages, collecting every row of a page first and
+        then reading the rows' details from a pool of tabs, so the grid stays on
+        its page and is paginated once per page instead of once per row.
+        """
+        select_page_size("80")
+        grid_window = driver.current_window_handle
+        tabs = open_detail_tabs(detail_tabs)
+        # The body of the last details page each tab showed, to tell when the next one replaced it
+        tab_bodies = {}
+
+        current_page = start_page
+        while current_page <= end_page:
+            # if the page navigation fails, break the loop
+            if not click_to_page(current_page):
+                break
+
+            rows = wait.until(EC.presence_of_all_elements_located((By.XPATH, "//table[@id='ctl00_ContentPlaceHolder1_LawyersGrid_DXMainTable']/tbody/tr[contains(@id, 'DXDataRow')]")))
+            # The grid doesn't reload while the tabs work, so its rows and buttons stay valid
+            targets = []
+            for i, row in enumerate(rows):
+                if checkpoint.has_row(current_page, i):
+                    continue  # Scraped before a crash or restart
+                try:
+                    targets.append((i, extract_table_row_data(row), row.find_element(By.XPATH, ".//a[contains(@id, 'btnPrintLicense')]")))
+                except Exception as e:
+                    print(f"Error processing row {i} on page {current_page}: {str(e)}")
+
+            for batch_start in range(0, len(targets), len(tabs)):
+                batch = list(zip(targets[batch_start:batch_start + len(tabs)], tabs))
+                # Start every tab's details page loading, then read them in turn
+                opened = []
+                for (i, row_data, details_button), (tab_name, handle) in batch:
+                    try:
+                        open_details_in_tab(details_button, tab_name)
+                    except Exception as e:
+                        print(f"Error processing row {i} on page {current_page}: {str(e)}")
+                        continue # Skip this row, its tab didn't start loading anything
+                    opened.append(((i, row_data, details_button), (tab_name, handle)))
+                for (i, row_data, details_button), (tab_name, handle) in opened:
+                    try:
+                        driver.switch_to.window(handle)
+                        if handle in tab_bodies:
+                            wait.until(EC.staleness_of(tab_bodies[handle]))
+                        wait.until(EC.presence_of_element_located((By.ID, 'ctl00_ContentPlaceHolder1_TxtName_I')))
+                        tab_bodies[handle] = driver.find_element(By.TAG_NAME, 'body')
+
+                        details_data = extract_lawyer_data()
+                        save_row(current_page, i, {**row_data, **details_data})
+                    except Exception as e:
+                        print(f"Error processing row {i} on page {current_page}: {str(e)}")
+                        continue # If there's an error with one row, continue to the next row
+                driver.switch_to.window(grid_window)
+
+            checkpoint.complete_page(current_page, len(rows))
+            current_page += 1
+
     def iterate_through_table(start_page, end_page):
         """
         Iterates through all rows on each table page, scraping data and moving to the next page.
@@ -202,7 +385,10 @@ def scrape_pages(start_page, end_page, file_suffix):
             # Re-fetch the rows on each iteration after page navigation
             rows = wait.until(EC.presence_of_all_elements_located((By.XPATH, "//table[@id='ctl00_ContentPlaceHolder1_LawyersGrid_DXMainTable']/tbody/tr[contains(@id, 'DXDataRow')]")))
             
-            for i in range(len(rows)):
+            num_rows = len(rows)
+            for i in range(num_rows):
+                if checkpoint.has_row(current_page, i):
+                    continue  # Scraped before a crash or restart
                 try:
                     # print(f"Processing row {i} on page {current_page}...")
                     # Re-fetch the rows inside the loop to avoid stale element error
@@ -228,14 +414,8 @@ def scrape_pages(start_page, end_page, file_suffix):
 
                     print(full_data)  # You can remove this print statement later
 
-                    # Save the extracted data into a CSV file
-                    with open(filename, mode='a', newline='', encoding='utf-8') as file:
-                        writer = csv.writer(file)
-                        writer.writerow([
-                            full_data['full_name'], full_data['alternative_name'], full_data['greek_name'], full_data['phone'], 
-                            full_data['fax'], full_data['court_box'], full_data['province'], full_data['address'], 
-                            full_data['postal_code'], full_data['email'], full_data['url'], full_data['mobile']
-                        ])
+                    # Save the extracted data into the checkpoint
+                    save_row(current_page, i, full_data)
                     
                     if not go_back_to_main_table_at_page(current_page):
                         break
@@ -244,42 +424,379 @@ def scrape_pages(start_page, end_page, file_suffix):
                     print(f"Error processing row {i} on page {current_page}: {str(e)}")
                     continue # If there's an error with one row, continue to the next row
 
+            checkpoint.complete_page(current_page, num_rows)
             current_page += 1
 
     try:
-        iterate_through_table(start_page, end_page)
+        if detail_tabs:
+            iterate_with_detail_tabs(start_page, end_page)
+        else:
+            iterate_through_table(start_page, end_page)
     finally:
         driver.quit()
 
+# Element IDs and names of the members grid and the details page
+GRID_ID = 'ctl00_ContentPlaceHolder1_LawyersGrid'
+GRID_NAME = 'ctl00$ContentPlaceHolder1$LawyersGrid'
+DETAIL_INPUTS = {
+    'alternative_name': 'ctl00_ContentPlaceHolder1_TxtName_I',
+    'address': 'ctl00_ContentPlaceHolder1_TxtAddress_I',
+    'postal_code': 'ctl00_ContentPlaceHolder1_TxtPostalCode_I',
+    'email': 'ctl00_ContentPlaceHolder1_TxtEmail_I',
+    'url': 'ctl00_ContentPlaceHolder1_TxtUrl_I',
+    'mobile': 'ctl00_ContentPlaceHolder1_txtMobile_I'
+}
+ROW_COLUMNS = ['full_name', 'greek_name', 'phone', 'fax', 'court_box', 'province']
+
+# DevExpress pager commands, as the pager links pass them to ASPx.GVPagerOnClick:
+# PN<index> jumps straight to a zero-based page, PSP<size> sets the page size
+PAGE_COMMAND = 'PN{index}'
+PAGE_SIZE_COMMAND = 'PSP{size}'
+# The grid pages through callbacks, not postbacks: GVPagerOnClick sends the
+# pager command as the argument of this grid callback command
+PAGER_CALLBACK = 'PAGERONCLICK'
+
+POSTBACK_PATTERN = re.compile(r"__doPostBack\(\s*'([^']*)'\s*,\s*'([^']*)'\s*\)")
+# A callback response, 0|/*DX*/({'id':0,'result':...}) with the callback's index first
+CALLBACK_RESPONSE_PATTERN = re.compile(r"^\s*\d+\|/\*DX\*/\((.*)\)\s*$", re.DOTALL)
+JS_STRING_PATTERN = re.compile(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"", re.DOTALL)
+JS_ESCAPE_PATTERN = re.compile(r"\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|.)", re.DOTALL)
+JS_ESCAPES = {'n': '\n', 'r': '\r', 't': '\t', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0'}
+
+def grid_callback_param(command, argument, keys='[]'):
+    """
+    Serializes a grid command for __CALLBACKPARAM the way ASPxGridView's client
+    script does: the keys of the visible rows, then the command and its argument,
+    each value after its length, e.g. c0:KV|2;[];GB|20;12|PAGERONCLICK3|PN1;
+    """
+    command_part = f'{len(command)}|{command}{len(argument)}|{argument}'
+    return f'c0:KV|{len(keys)};{keys};GB|{len(command_part)};{command_part};'
+
+def decode_js_string(content):
+    def unescape(match):
+        escape = match.group(1)
+        if escape[0] in 'ux' and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return JS_ESCAPES.get(escape, escape)
+    return JS_ESCAPE_PATTERN.sub(unescape, content)
+
+def parse_js_literal(text):
+    """
+    Parses the JavaScript object literal in a callback response. It is JSON
+    apart from its single-quoted strings, which are re-encoded as JSON strings.
+    """
+    def to_json_string(match):
+        content = match.group(1) if match.group(1) is not None else match.group(2)
+        return json.dumps(decode_js_string(content))
+    return json.loads(JS_STRING_PATTERN.sub(to_json_string, text))
+
+def parse_callback_response(text):
+    """
+    Returns the grid markup and, where the DevExpress version sends it, the
+    grid's new client state from a callback response.
+    """
+    match = CALLBACK_RESPONSE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Not a grid callback response: {text[:100]!r}")
+    response = parse_js_literal(match.group(1))
+    if 'error' in response:
+        raise ValueError(f"Grid callback failed: {response['error']}")
+    result = response['result']
+    if isinstance(result, dict):
+        return result.get('html', ''), result.get('stateObject')
+    return result, None
+
+def request_key(method, url, data=None):
+    """
+    Identifies a request for recording and replaying it. Everything posted back
+    comes from earlier responses, so replaying recorded responses reproduces the
+    same requests and keys.
+    """
+    parts = urlsplit(url)
+    fields = sorted(parse_qsl(data, keep_blank_values=True)) if isinstance(data, str) else sorted((data or {}).items())
+    key_data = repr((method, parts.path, parts.query, fields))
+    return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+class GridClient:
+    """
+    Browserless client for the members grid. It replays the grid's DevExpress
+    callbacks and the page's ASP.NET postbacks over a pooled requests session.
+    Callbacks page the grid without reloading the page, so the form keeps the
+    page's __VIEWSTATE and __EVENTVALIDATION while the grid's client state
+    field is updated from each callback response, the way the page's script
+    does. Any grid page is one callback away, and a details postback carries
+    the grid's state so the server finds the row on the current page.
+    """
+
+    def __init__(self, base_url=BASE_URL, page_size=80, record_dir=None, timeout=30):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.base_url = base_url
+        self.page_size = page_size
+        self.record_dir = record_dir
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Keep-alive connections, with retries on transient server errors
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504], allowed_methods=None)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retries)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.form_url = None
+        self.form_fields = None
+
+    def send(self, method, url, data=None):
+        response = self.session.request(method, url, data=data, timeout=self.timeout)
+        response.raise_for_status()
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+            with open(os.path.join(self.record_dir, request_key(method, url, data) + '.html'), 'wb') as file:
+                file.write(response.content)
+        return response
+
+    def request(self, method, url, data=None):
+        from lxml import html
+
+        response = self.send(method, url, data)
+        # Decode with the charset from the response headers, lxml alone would guess
+        return html.fromstring(response.content, base_url=response.url, parser=html.HTMLParser(encoding=response.encoding))
+
+    def keep_form(self, doc):
+        """Remembers the page's form and its current field values for the next postback."""
+        form = doc.forms[0]
+        self.form_url = urljoin(doc.base_url, form.get('action') or '')
+        self.form_fields = dict(form.form_values())
+
+    def postback(self, target, argument='', keep_form=True):
+        data = {**self.form_fields, '__EVENTTARGET': target, '__EVENTARGUMENT': argument}
+        doc = self.request('POST', self.form_url, data)
+        if keep_form:
+            self.keep_form(doc)
+        return doc
+
+    def grid_keys(self):
+        """The keys of the grid's visible rows from its client state, as the callback sends them."""
+        try:
+            keys = json.loads(self.form_fields.get(GRID_NAME) or '{}').get('keys', [])
+        except (ValueError, AttributeError):
+            keys = []
+        return json.dumps(keys, separators=(',', ':'))
+
+    def callback(self, command, argument):
+        """
+        Sends a grid callback like the page's script does and returns the grid's
+        new markup. The grid's client state in the form is updated from the
+        response; the rest of the form stays as the last full page left it.
+        """
+        from lxml import html
+
+        data = {
+            **self.form_fields,
+            '__EVENTTARGET': '',
+            '__EVENTARGUMENT': '',
+            '__CALLBACKID': GRID_NAME,
+            '__CALLBACKPARAM': grid_callback_param(command, argument, self.grid_keys()),
+        }
+        response = self.send('POST', self.form_url, data)
+        markup, state = parse_callback_response(response.content.decode(response.encoding or 'utf-8'))
+        grid = html.fragment_fromstring(markup, create_parent='div', base_url=response.url)
+        if state is not None:
+            self.form_fields[GRID_NAME] = json.dumps(state, separators=(',', ':'))
+        # Versions without a state object render the grid's state fields into the markup
+        for field in grid.xpath('.//input[@name]'):
+            if field.get('name').startswith(GRID_NAME):
+                self.form_fields[field.get('name')] = field.get('value', '')
+        return grid
+
+    def open(self):
+        """Loads the members page and sets the grid's page size."""
+        self.keep_form(self.request('GET', self.base_url + MEMBERS_PATH))
+        self.callback(PAGER_CALLBACK, PAGE_SIZE_COMMAND.format(size=self.page_size))
+
+    def get_page_rows(self, page):
+        """
+        Moves the grid to a 1-based page with a single callback and returns its
+        rows, each with the postback or link that opens its details.
+        """
+        grid = self.callback(PAGER_CALLBACK, PAGE_COMMAND.format(index=page - 1))
+        rows = []
+        for row in grid.xpath(f".//table[@id='{GRID_ID}_DXMainTable']/tbody/tr[contains(@id, 'DXDataRow')]"):
+            columns = [column.text_content().replace('\xa0', ' ').strip() for column in row.xpath('./td')]
+            row_data = dict(zip(ROW_COLUMNS, columns[1:7]))
+            details = row.xpath(".//a[contains(@id, 'btnPrintLicense')]")
+            row_data['details'] = self.details_target(details[0]) if details else None
+            rows.append(row_data)
+        return rows
+
+    def details_target(self, link):
+        """Returns ('postback', target, argument) for a postback link, or ('get', url) for a plain one."""
+        script = (link.get('href') or '') + ' ' + (link.get('onclick') or '')
+        match = POSTBACK_PATTERN.search(script)
+        if match:
+            return ('postback', match.group(1), match.group(2))
+        return ('get', urljoin(self.form_url, link.get('href')))
+
+    def get_details(self, target):
+        """Fetches a details page without changing the grid's form state."""
+        if target[0] == 'postback':
+            doc = self.postback(target[1], target[2], keep_form=False)
+        else:
+            doc = self.request('GET', target[1])
+        return {field: (doc.xpath(f"//input[@id='{input_id}']/@value") or [''])[0] for field, input_id in DETAIL_INPUTS.items()}
+
+def scrape_pages_http(start_page, end_page, checkpoint, base_url=BASE_URL, record_dir=None):
+    """
+    Scrapes a range of grid pages with the browserless client, recording the same
+    rows as scrape_pages. Moving to a page costs one callback, however deep it is.
+    """
+    client = GridClient(base_url, record_dir=record_dir)
+    client.open()
+
+    for current_page in range(start_page, end_page + 1):
+        if current_page in checkpoint.completed:
+            continue
+        try:
+            rows = client.get_page_rows(current_page)
+        except Exception as e:
+            print(f"Failed to load page {current_page}: {str(e)}")
+            break
+        print(f"Page {current_page}: {len(rows)} rows")
+
+        for i, row_data in enumerate(rows):
+            if checkpoint.has_row(current_page, i):
+                continue  # Scraped before a crash or restart
+            try:
+                details_data = client.get_details(row_data['details']) if row_data['details'] else dict.fromkeys(DETAIL_INPUTS, '')
+                checkpoint.add_row(current_page, i, csv_row({**row_data, **details_data}))
+            except Exception as e:
+                print(f"Error processing row {i} on page {current_page}: {str(e)}")
+                continue # If there's an error with one row, continue to the next row
+        checkpoint.complete_page(current_page, len(rows))
+
+def make_recorded_server(record_dir, port):
+    """
+    Returns an HTTP server standing in for the site, answering each request with
+    the response recorded for it by --record_dir, to run and test the http
+    engine offline. Port 0 picks a free port.
+    """
+    class RecordedHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass  # One line per request would drown out the scraper's output
+
+        def respond(self, data=None):
+            method = 'GET' if data is None else 'POST'
+            path = os.path.join(record_dir, request_key(method, self.path, data) + '.html')
+            if not os.path.exists(path):
+                self.send_error(404, f"No recorded response for {method} {self.path}")
+                return
+            with open(path, 'rb') as file:
+                body = file.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.respond()
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.respond(dict(parse_qsl(self.rfile.read(length).decode('utf-8'), keep_blank_values=True)))
+
+    return ThreadingHTTPServer(('127.0.0.1', port), RecordedHandler)
+
+def serve_recorded(record_dir, port):
+    """Serves the responses recorded in record_dir until interrupted."""
+    server = make_recorded_server(record_dir, port)
+    print(f"Serving recorded pages from {record_dir} on http://127.0.0.1:{server.server_port}")
+    server.serve_forever()
+
 # Parallelization using ThreadPoolExecutor or ProcessPoolExecutor
-def run_parallel_scraping(start_page, end_page, chunk_size=5):
+def run_parallel_scraping(start_page, end_page, chunk_size=5, engine='selenium', base_url=BASE_URL, record_dir=None, detail_tabs=0,
+                          checkpoint_dir='scrape_checkpoints', output_csv='lawyers_data.csv'):
     """
     Runs the scraper in parallel for a range of pages, starting from start_page.
+    Pages completed in earlier runs are skipped and partly scraped pages resume
+    after their last saved row; every worker's rows are then merged into one CSV.
 
     Args:
     - start_page (int): The starting page for the scraping process.
     - end_page (int): The last page to scrape.
     - chunk_size (int): The number of pages each driver instance handles.
+    - engine (str): 'selenium' to drive Chrome, or 'http' to replay the grid callbacks and postbacks without a browser.
+    - base_url (str): Site the http engine scrapes, e.g. a --serve_recorded stand-in.
+    - record_dir (str): Where the http engine records every response, for --serve_recorded.
+    - detail_tabs (int): Number of tabs the selenium engine opens details pages in, keeping the grid on its page. 0 opens them in the grid's tab.
+    - checkpoint_dir (str): Where each worker keeps its checkpoint.
+    - output_csv (str): The merged, deduplicated output.
     """
-    total_pages = end_page - start_page + 1
-    num_threads = total_pages // chunk_size + 1
-    # num_threads = 1  # Set the number of threads to run concurrently
-    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = []
-        for i in range(start_page - 1, end_page, chunk_size):
-            page_start = i + 1
-            page_end = min(i + chunk_size, end_page)
-            file_suffix = f"{timestamp}_{page_start}_{page_end}"
-            futures.append(executor.submit(scrape_pages, page_start, page_end, file_suffix))
-
-        # Wait for all threads to finish
-        for future in futures:
-            future.result()
-
-# Running the parallel scraper for pages 100 to 109
-start_page = 1
-end_page = 55
-run_parallel_scraping(start_page, end_page)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    pages, completed = load_checkpoints(checkpoint_dir)
+    missing_pages = [page for page in range(start_page, end_page + 1) if page not in completed]
+    if len(missing_pages) < end_page - start_page + 1:
+        print(f"Resuming: {end_page - start_page + 1 - len(missing_pages)} pages already done, {len(missing_pages)} to go.")
+
+    # Split the missing pages into runs of consecutive pages, at most chunk_size long
+    chunks = []
+    for page in missing_pages:
+        if chunks and page == chunks[-1][-1] + 1 and len(chunks[-1]) < chunk_size:
+            chunks[-1].append(page)
+        else:
+            chunks.append([page])
+
+    if chunks:
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = []
+            for chunk in chunks:
+                page_start, page_end = chunk[0], chunk[-1]
+                # Each worker starts from the rows already saved for its pages, by any earlier worker
+                checkpoint = Checkpoint(os.path.join(checkpoint_dir, f'pages_{page_start}_{page_end}.json'),
+                                        {page: dict(pages[page]) for page in chunk if page in pages})
+                if engine == 'http':
+                    futures.append(executor.submit(scrape_pages_http, page_start, page_end, checkpoint, base_url, record_dir))
+                else:
+                    futures.append(executor.submit(scrape_pages, page_start, page_end, checkpoint, detail_tabs))
+
+            # Wait for all threads to finish; a failed worker's pages are picked up by the next run
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Worker failed: {str(e)}")
+
+    _, completed = load_checkpoints(checkpoint_dir)
+    still_missing = [page for page in range(start_page, end_page + 1) if page not in completed]
+    num_rows = merge_checkpoints(checkpoint_dir, output_csv)
+    print(f"{num_rows} unique rows saved to {output_csv}.")
+    if still_missing:
+        print(f"Pages not completed, run again to resume them: {still_missing}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape the Cyprus Bar Association's advocate members list.")
+    parser.add_argument('--start_page', type=int, default=1, help='First grid page to scrape')
+    parser.add_argument('--end_page', type=int, default=55, help='Last grid page to scrape')
+    parser.add_argument('--chunk_size', type=int, default=5, help='Pages per parallel worker')
+    parser.add_argument('--engine', choices=['selenium', 'http'], default='selenium', help='Drive Chrome, or replay the grid callbacks and postbacks over HTTP without a browser')
+    parser.add_argument('--detail_tabs', type=int, default=0, help='Selenium engine: collect a grid page\'s rows first and open their details in this many tabs, so the grid stays on its page. 0 opens details in the grid\'s tab and re-paginates after each row')
+    parser.add_argument('--checkpoint_dir', default='scrape_checkpoints', help='Where workers checkpoint their progress; a re-run resumes from it')
+    parser.add_argument('--output_csv', default='lawyers_data.csv', help='Merged, deduplicated output CSV')
+    parser.add_argument('--base_url', default=BASE_URL, help='Site for the http engine, e.g. a --serve_recorded stand-in')
+    parser.add_argument('--record_dir', default=None, help='Record every response of the http engine here')
+    parser.add_argument('--serve_recorded', action='store_true', default=False, help='Serve the responses in --record_dir as a local stand-in for the site, instead of scraping')
+    parser.add_argument('--port', type=int, default=8000, help='Port for --serve_recorded')
+    args = parser.parse_args()
+
+    if args.serve_recorded:
+        serve_recorded(args.record_dir, args.port)
+        return
+
+    # Running the parallel scraper for the requested pages
+    run_parallel_scraping(args.start_page, args.end_page, args.chunk_size, args.engine, args.base_url, args.record_dir, args.detail_tabs,
+                          args.checkpoint_dir, args.output_csv)
+
+if __name__ == '__main__':
+    main()
 
 
@@ -0,0 +1,273 @@
+import base64
+import html
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import pytest
+import requests
+
+from scrape_cyprus_lawyer import (
+    GRID_NAME, MEMBERS_PATH, Checkpoint, GridClient, grid_callback_param, make_recorded_server, parse_callback_response,
+    scrape_pages_http
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'cyprus_bar')
+
+VIEWSTATE = '/wEPDwUKMTY3NzE5MjIwOQ9kFgJmD2QWAgIDD2QWAgIBDzwrAAoBAA8WBB4LXyFEYXRhQm91bmRnHgtfIUl0ZW1Db3VudAJkZGQ='
+EVENTVALIDATION = '/wEdAAJmt5XLnJ3Kn0x7ZtK4Nf8cHRm8jDsC6n8FEeWDkXU3oA=='
+DEFAULT_PAGE_SIZE = 20
+
+SURNAMES = [
+    ('Andreou', 'Ανδρέου'), ('Charalambous', 'Χαραλάμπους'), ('Georgiou', 'Γεωργίου'), ('Ioannou', 'Ιωάννου'),
+    ('Christodoulou', 'Χριστοδούλου'), ('Constantinou', 'Κωνσταντίνου'), ('Demetriou', 'Δημητρίου'),
+    ('Nicolaou', 'Νικολάου'), ('Panayiotou', 'Παναγιώτου'), ('Savva', 'Σάββα'),
+]
+FIRST_NAMES = [
+    ('Maria', 'Μαρία'), ('Petros', 'Πέτρος'), ('Elena', 'Έλενα'), ('Nikos', 'Νίκος'), ('Andreas', 'Ανδρέας'),
+    ('Sofia', 'Σοφία'), ('Michalis', 'Μιχάλης'), ('Eleni', 'Ελένη'), ('Kyriakos', 'Κυριάκος'), ('Anna', 'Άννα'),
+]
+PROVINCES = ['Nicosia', 'Limassol', 'Larnaca', 'Paphos', 'Famagusta']
+
+def lawyer(number):
+    """The member listed at a 1-based position, with enough blanks to cover empty cells and fields."""
+    (surname, greek_surname), (first_name, greek_first_name) = SURNAMES[(number - 1) % 10], FIRST_NAMES[(number - 1) // 10]
+    return {
+        'number': str(number),
+        'full_name': f'{surname} {first_name}',
+        'alternative_name': f'{surname} {first_name}'.upper(),
+        'greek_name': f'{greek_surname} {greek_first_name}',
+        'phone': f'22 {number:06d}',
+        'fax': '' if number % 3 == 0 else f'22 {number + 500000:06d}',
+        'court_box': '' if number % 7 == 0 else str(number),
+        'province': PROVINCES[(number - 1) % len(PROVINCES)],
+        'address': f'{number} Makariou Avenue',
+        'postal_code': str(1000 + number),
+        'email': f'{first_name.lower()}.{surname.lower()}@example.com',
+        'url': '',
+        'mobile': f'99 {number:06d}',
+    }
+
+ROSTER = [lawyer(number) for number in range(1, 101)]
+
+def expected_pages(page_size, pages):
+    return {
+        page: {
+            i: [member['full_name'], member['alternative_name'], member['greek_name'], member['phone'], member['fax'],
+                member['court_box'], member['province'], member['address'], member['postal_code'], member['email'],
+                member['url'], member['mobile']]
+            for i, member in enumerate(ROSTER[(page - 1) * page_size:page * page_size])
+        }
+        for page in pages
+    }
+
+def render(name, **values):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as file:
+        template = file.read()
+    # Field names are full of $, so no string.Template
+    return re.sub(r'\{\{(\w+)\}\}', lambda match: values[match.group(1)], template)
+
+def js_string(text):
+    """Quotes text the way DevExpress writes strings into callback responses."""
+    def escape(char):
+        if char in '\\\'':
+            return '\\' + char
+        if char == '\n':
+            return '\\n'
+        if char == '\r':
+            return '\\r'
+        if ord(char) > 126:
+            return f'\\u{ord(char):04x}'
+        return char
+    return "'" + ''.join(escape(char) for char in text) + "'"
+
+def take_prefixed(text, separator):
+    """Reads a <length><separator><value> field, returning the value and the rest."""
+    length, found, rest = text.partition(separator)
+    if not found or not length.isdigit() or len(rest) < int(length):
+        raise ValueError(text)
+    return rest[:int(length)], rest[int(length):]
+
+def parse_callback_param(param):
+    """Splits c0:KV|<length>;<keys>;GB|<length>;<length>|<command><length>|<argument>; like the grid does."""
+    if not param.startswith('c0:KV|'):
+        raise ValueError(param)
+    keys, rest = take_prefixed(param[len('c0:KV|'):], ';')
+    if not rest.startswith(';GB|'):
+        raise ValueError(param)
+    body, rest = take_prefixed(rest[len(';GB|'):], ';')
+    command, argument = take_prefixed(body, '|')
+    argument, tail = take_prefixed(argument, '|')
+    if rest != ';' or tail:
+        raise ValueError(param)
+    return json.loads(keys), command, argument
+
+class FakeGridHandler(BaseHTTPRequestHandler):
+    """
+    Answers like the members page with an ASPxGridView on it. The page renders
+    the grid and its client state; pager callbacks (__CALLBACKID and a
+    length-prefixed __CALLBACKPARAM) return the grid's markup and new state as a
+    callback response, without a new __VIEWSTATE; a row's btnPrintLicense
+    postback opens its details page, resolving the row's visible index against
+    the grid state it carries. Anything else is rejected, including the pager
+    commands sent as plain postbacks.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body):
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def grid_state(page_index, page_size):
+        visible = range(page_index * page_size, min((page_index + 1) * page_size, len(ROSTER)))
+        callback_state = base64.b64encode(json.dumps({'pageIndex': page_index, 'pageSize': page_size}).encode('ascii'))
+        return {'keys': [ROSTER[i]['number'] for i in visible], 'callbackState': callback_state.decode('ascii'), 'selection': ''}
+
+    @staticmethod
+    def grid_markup(page_index, page_size):
+        visible = range(page_index * page_size, min((page_index + 1) * page_size, len(ROSTER)))
+        rows = ''.join(
+            render('grid_row.html', index=str(i), **{field: html.escape(value) or '&nbsp;' for field, value in ROSTER[i].items()})
+            for i in visible
+        )
+        page_count = -(-len(ROSTER) // page_size)
+        pager = ''.join(
+            f"<a onclick=\"ASPx.GVPagerOnClick('ctl00_ContentPlaceHolder1_LawyersGrid','PN{index}');\">{index + 1}</a>"
+            for index in range(page_count)
+        )
+        return render('grid.html', rows=rows, pager=pager)
+
+    def do_GET(self):
+        if self.path != MEMBERS_PATH:
+            self.send_error(404)
+            return
+        self.send_body(render(
+            'members_page.html', viewstate=VIEWSTATE, eventvalidation=EVENTVALIDATION,
+            state=html.escape(json.dumps(self.grid_state(0, DEFAULT_PAGE_SIZE))), grid=self.grid_markup(0, DEFAULT_PAGE_SIZE)
+        ))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = dict(parse_qsl(self.rfile.read(length).decode('utf-8'), keep_blank_values=True))
+        if form.get('__VIEWSTATE') != VIEWSTATE or form.get('__EVENTVALIDATION') != EVENTVALIDATION:
+            self.send_error(400, 'Invalid viewstate')
+            return
+        try:
+            state = json.loads(form[GRID_NAME])
+            grid = json.loads(base64.b64decode(state['callbackState']))
+        except (KeyError, ValueError):
+            self.send_error(400, 'Invalid grid state')
+            return
+
+        if '__CALLBACKID' in form:
+            self.callback(form, state, grid['pageIndex'], grid['pageSize'])
+            return
+        details = re.fullmatch(re.escape(GRID_NAME) + r'\$cell(\d+)_7\$btnPrintLicense', form.get('__EVENTTARGET', ''))
+        visible_index = int(details.group(1)) if details else -1
+        first = grid['pageIndex'] * grid['pageSize']
+        if not first <= visible_index < min(first + grid['pageSize'], len(ROSTER)):
+            self.send_error(400, f"Unexpected postback {form.get('__EVENTTARGET')} {form.get('__EVENTARGUMENT')}")
+            return
+        self.send_body(render('details_page.html', **{field: html.escape(value) for field, value in ROSTER[visible_index].items()}))
+
+    def callback(self, form, state, page_index, page_size):
+        try:
+            keys, command, pager = parse_callback_param(form.get('__CALLBACKPARAM', ''))
+        except ValueError:
+            keys = command = pager = None
+        if form.get('__CALLBACKID') != GRID_NAME or form.get('__EVENTTARGET') or keys != state['keys'] or command != 'PAGERONCLICK':
+            self.send_body("0|/*DX*/({'id':0,'error':{'message':'Invalid callback'}})")
+            return
+
+        if re.fullmatch(r'PN\d+', pager) and int(pager[2:]) * page_size < len(ROSTER):
+            page_index = int(pager[2:])
+        elif re.fullmatch(r'PSP\d+', pager):
+            page_index, page_size = 0, int(pager[3:])
+        else:
+            self.send_body(f"0|/*DX*/({{'id':0,'error':{{'message':{js_string('Unknown pager command ' + pager)}}}}})")
+            return
+        new_state = self.grid_state(page_index, page_size)
+        self.send_body(
+            "0|/*DX*/({'id':0,'result':{'stateObject':" + json.dumps(new_state)
+            + ",'html':" + js_string(self.grid_markup(page_index, page_size)) + "}})"
+        )
+
+@contextmanager
+def running(server):
+    """Serves from a background thread and yields the server's base URL."""
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+@pytest.fixture
+def fake_grid():
+    with running(ThreadingHTTPServer(('127.0.0.1', 0), FakeGridHandler)) as base_url:
+        yield base_url
+
+def test_grid_callback_param_prefixes_lengths():
+    assert grid_callback_param('PAGERONCLICK', 'PN1') == 'c0:KV|2;[];GB|20;12|PAGERONCLICK3|PN1;'
+    assert grid_callback_param('PAGERONCLICK', 'PSP80', '["7","8"]') == 'c0:KV|9;["7","8"];GB|22;12|PAGERONCLICK5|PSP80;'
+
+def test_parse_callback_response_decodes_js_strings():
+    markup, state = parse_callback_response(
+        "0|/*DX*/({'id':0,'result':{'stateObject':{'keys':['7'],'callbackState':'e30='},"
+        "'html':'<td class=\"dxgv\">\\u0391\\u03bd\\u03b4\\u03c1\\u03ad\\u03bf\\u03c5 O\\'Brien</td>\\r\\n'}})"
+    )
+    assert markup == '<td class="dxgv">Ανδρέου O\'Brien</td>\r\n'
+    assert state == {'keys': ['7'], 'callbackState': 'e30='}
+    with pytest.raises(ValueError):
+        parse_callback_response("0|/*DX*/({'id':0,'error':{'message':'Invalid callback'}})")
+
+def test_fake_grid_rejects_pager_postbacks(fake_grid):
+    # The pager commands as plain postbacks, which the site doesn't answer with a grid page
+    client = GridClient(fake_grid)
+    client.keep_form(client.request('GET', fake_grid + MEMBERS_PATH))
+    with pytest.raises(requests.HTTPError):
+        client.postback(GRID_NAME, 'PN1')
+
+def test_scrape_pages_http_reads_rows_and_details(fake_grid, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'pages_1.json'))
+    scrape_pages_http(1, 2, checkpoint, base_url=fake_grid)
+    assert checkpoint.pages == expected_pages(80, [1, 2])
+    assert checkpoint.completed == {1, 2}
+    assert len(checkpoint.pages[2]) == 20
+    assert checkpoint.pages[1][0] == ['Andreou Maria', 'ANDREOU MARIA', 'Ανδρέου Μαρία', '22 000001', '22 500001', '1', 'Nicosia',
+                                      '1 Makariou Avenue', '1001', 'maria.andreou@example.com', '', '99 000001']
+    assert checkpoint.pages[2][2] == ['Georgiou Kyriakos', 'GEORGIOU KYRIAKOS', 'Γεωργίου Κυριάκος', '22 000083', '22 500083', '83',
+                                      'Larnaca', '83 Makariou Avenue', '1083', 'kyriakos.georgiou@example.com', '', '99 000083']
+
+def test_get_details_keeps_grid_form_state(fake_grid):
+    client = GridClient(fake_grid)
+    client.open()
+    rows = client.get_page_rows(2)
+    form_fields = dict(client.form_fields)
+    details = client.get_details(rows[3]['details'])
+    assert rows[3]['full_name'] == 'Ioannou Kyriakos'
+    assert details['email'] == 'kyriakos.ioannou@example.com'
+    assert client.form_fields == form_fields
+    assert client.form_fields['__VIEWSTATE'] == VIEWSTATE
+
+def test_serve_recorded_replays_a_scrape(fake_grid, tmp_path):
+    record_dir = str(tmp_path / 'recorded')
+    scrape_pages_http(1, 2, Checkpoint(str(tmp_path / 'live.json')), base_url=fake_grid, record_dir=record_dir)
+
+    checkpoint = Checkpoint(str(tmp_path / 'replayed.json'))
+    with running(make_recorded_server(record_dir, 0)) as base_url:
+        scrape_pages_http(1, 2, checkpoint, base_url=base_url)
+    assert checkpoint.pages == expected_pages(80, [1, 2])
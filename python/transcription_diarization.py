@@ -1,13 +1,26 @@
-import whisper
-import torch
-from pyannote.audio import Pipeline
+# torch, whisper, pyannote, ffmpeg and numpy are imported inside the functions
+# that use them, so --help and the lightweight subcommands start quickly
 import argparse
 import os
 import logging
 from datetime import datetime
 import time
-import ffmpeg
-import numpy as np
+import heapq
+import wave
+import multiprocessing
+import hashlib
+import threading
+import glob
+import sys
+from contextlib import ExitStack, contextmanager
+import re
+import json
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
 
 # Configure logging to include timestamps
 logging.basicConfig(
@@ -17,59 +30,327 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Whisper and the pyannote pipeline both work on 16kHz mono audio
+SAMPLE_RATE = 16000
+# Samples per Whisper mel frame, the unit of a segment's 'seek'. Same as
+# whisper.audio.HOP_LENGTH, kept here so chunking works with any engine
+HOP_LENGTH = 160
+
+DIARIZATION_MODEL = "pyannote/speaker-diarization-3.1"
+
+# Seconds between resident memory samples while a stage runs
+RSS_SAMPLE_INTERVAL = 0.05
+
 def check_gpu():
+    import torch
+
     if torch.cuda.is_available():
         logger.info(f"GPU is available: {torch.cuda.get_device_name(0)}")
     else:
         logger.warning("GPU is not available. Using CPU instead.")
 
-def transcribe_audio(file_path):
-    logger.info("Starting transcription...")
-    model = whisper.load_model("large-v3").to(torch.device("cuda"))
-    logger.info("Model loaded to GPU.")
+# Loaded transcription engines and diarization pipelines, keyed by model and
+# device, so repeated transcriptions in one process reuse the weights
+_model_cache = {}
+# Guards loading into _model_cache, while _model_locks lets worker threads in
+# batch mode take turns running the same model
+_model_cache_lock = threading.Lock()
+_model_locks = {}
+
+def get_device(device=None):
+    """
+    Returns the torch device to run on, preferring CUDA when it is available.
+    """
+    import torch
+
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    return torch.device(device)
+
+# Decoding settings shared by every engine, overridable from the CLI
+DEFAULT_TRANSCRIBE_OPTIONS = {'engine': "whisper", 'beam_size': 5, 'best_of': 3, 'temperature': 0.2}
+
+class TranscriptionEngine:
+    """
+    Loads a speech recognition model once and transcribes audio into the same
+    (text, segments) structure openai-whisper returns.
+    """
+    # Engines running on a torch device; the others get the device name as given
+    uses_torch = True
+
+    def __init__(self, model_name, device):
+        self.model_name = model_name
+        self.device = device
+
+    def transcribe(self, audio, word_timestamps, beam_size, best_of, temperature):
+        raise NotImplementedError
+
+class WhisperEngine(TranscriptionEngine):
+    """
+    openai-whisper in fp32 on CPU or fp16 on CUDA.
+    """
+    def __init__(self, model_name, device):
+        super().__init__(model_name, device)
+        import whisper
+
+        self.model = whisper.load_model(model_name, device=device)
+
+    def transcribe(self, audio, word_timestamps, beam_size, best_of, temperature):
+        result = self.model.transcribe(
+            audio,
+            temperature=temperature,
+            best_of=best_of,
+            beam_size=beam_size,
+            language="en",
+            verbose=True,
+            fp16=self.device.type == "cuda",  # fp16 isn't supported on CPU
+            no_speech_threshold=0.3,  # Lowered from default
+            logprob_threshold=-1.0,   # Allow low-confidence predictions
+            condition_on_previous_text=False,  # Prevent conditioning on previous text
+            word_timestamps=word_timestamps
+        )
+        return result["text"], result["segments"]
+
+class FasterWhisperEngine(TranscriptionEngine):
+    """
+    faster-whisper (CTranslate2) with int8 weights on CPU and fp16 on CUDA, which
+    runs the same Whisper checkpoints several times faster on CPU.
+    """
+    def __init__(self, model_name, device):
+        super().__init__(model_name, device)
+        # Only needed for this engine, so it isn't a hard dependency of the script
+        from faster_whisper import WhisperModel
+        compute_type = "float16" if device.type == "cuda" else "int8"
+        self.model = WhisperModel(model_name, device=device.type, compute_type=compute_type)
+
+    def transcribe(self, audio, word_timestamps, beam_size, best_of, temperature):
+        segments, _ = self.model.transcribe(
+            audio,
+            temperature=temperature,
+            best_of=best_of,
+            beam_size=beam_size,
+            language="en",
+            no_speech_threshold=0.3,
+            log_prob_threshold=-1.0,
+            condition_on_previous_text=False,
+            word_timestamps=word_timestamps
+        )
+        # Segments are produced lazily while decoding, convert them to Whisper's dicts
+        results = []
+        for segment in segments:
+            result = {
+                'id': segment.id,
+                'seek': segment.seek,
+                'start': segment.start,
+                'end': segment.end,
+                'text': segment.text,
+                'tokens': list(segment.tokens),
+                'temperature': segment.temperature,
+                'avg_logprob': segment.avg_logprob,
+                'compression_ratio': segment.compression_ratio,
+                'no_speech_prob': segment.no_speech_prob,
+            }
+            if segment.words is not None:
+                result['words'] = [
+                    {'word': word.word, 'start': word.start, 'end': word.end, 'probability': word.probability}
+                    for word in segment.words
+                ]
+            logger.info(f"[{segment.start:.2f} --> {segment.end:.2f}]{segment.text}")
+            results.append(result)
+        return "".join(result['text'] for result in results), results
+
+class StubEngine(TranscriptionEngine):
+    """
+    Deterministic engine for tests and benchmarks: one segment per five seconds of
+    audio with fixed text, without loading any model or importing torch.
+    """
+    uses_torch = False
+    segment_seconds = 5.0
+
+    def transcribe(self, audio, word_timestamps, beam_size, best_of, temperature):
+        duration = get_audio_duration(audio)
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + self.segment_seconds, duration)
+            segment = {'id': len(segments), 'seek': int(start * 100), 'start': start, 'end': end, 'text': f" Segment {len(segments)}."}
+            if word_timestamps:
+                middle = (start + end) / 2
+                segment['words'] = [
+                    {'word': " Segment", 'start': start, 'end': middle, 'probability': 1.0},
+                    {'word': f" {len(segments)}.", 'start': middle, 'end': end, 'probability': 1.0},
+                ]
+            segments.append(segment)
+            start = end
+        return "".join(segment['text'] for segment in segments), segments
 
-    # Load audio using Whisper's load_audio function
-    audio = whisper.load_audio(file_path)
-    logger.info(f"Audio loaded. Shape: {audio.shape}")
+TRANSCRIPTION_ENGINES = {
+    "whisper": WhisperEngine,
+    "faster-whisper": FasterWhisperEngine,
+    "stub": StubEngine,
+}
 
-    
-    # Move audio to GPU
-    audio_tensor = torch.from_numpy(audio).to(torch.device("cuda"))
-    logger.info("Audio moved to GPU.")
+def get_engine_device(engine_name, device=None):
+    """
+    Returns the device an engine runs on: a torch device for the model engines,
+    or the requested name ("cpu" by default) for engines that don't use torch.
+    """
+    if not TRANSCRIPTION_ENGINES[engine_name].uses_torch:
+        return device or "cpu"
+    return get_device(device)
 
-    # Transcribe audio
+def load_transcription_engine(engine_name="whisper", model_name="large-v3", device=None):
+    device = get_engine_device(engine_name, device)
+    key = (engine_name, model_name, str(device))
+    with _model_cache_lock:
+        if key not in _model_cache:
+            logger.info(f"Loading {engine_name} model {model_name} to {device}...")
+            _model_cache[key] = TRANSCRIPTION_ENGINES[engine_name](model_name, device)
+            _model_locks[key] = threading.Lock()
+            logger.info("Model loaded.")
+        else:
+            logger.info(f"Reusing loaded {engine_name} model {model_name} on {device}.")
+    return _model_cache[key]
+
+def transcribe_audio(audio, model_name="large-v3", device=None, word_timestamps=False, options=None):
+    """
+    Transcribes a file path or a 16kHz mono float32 array from decode_audio.
+    options picks the engine and its decoding settings, see DEFAULT_TRANSCRIBE_OPTIONS.
+    """
+    logger.info("Starting transcription...")
+    options = {**DEFAULT_TRANSCRIBE_OPTIONS, **(options or {})}
+    device = get_engine_device(options['engine'], device)
+    engine = load_transcription_engine(options['engine'], model_name, device)
+
+    # Transcribe audio from file path or decoded samples
     logger.info("Transcribing audio...")
-    result = model.transcribe(audio_tensor)
-    transcription = result["text"]
-    segments = result["segments"]
+    with _model_locks[(options['engine'], model_name, str(device))]:
+        transcription, segments = engine.transcribe(
+            audio,
+            word_timestamps,
+            options['beam_size'],
+            options['best_of'],
+            options['temperature']
+        )
     logger.info("Transcription completed.")
     return transcription, segments
 
-def transcribe_audio(file_path):
-    logger.info("Starting transcription...")
-    model = whisper.load_model("large-v3").to(torch.device("cuda"))
-    logger.info("Model loaded to GPU.")
-
-    # Transcribe audio from file path
-    logger.info("Transcribing audio from file...")
-    result = model.transcribe(
-        file_path,
-        temperature=0.2,
-        best_of=3,
-        beam_size=5,
-        language="en",
-        verbose=True,
-        no_speech_threshold=0.3,  # Lowered from default
-        logprob_threshold=-1.0,   # Allow low-confidence predictions
-        condition_on_previous_text=False  # Prevent conditioning on previous text
+def find_chunk_boundaries(audio, chunk_seconds=600.0, search_seconds=30.0, sample_rate=SAMPLE_RATE, frame_seconds=0.05):
+    """
+    Picks cut points roughly chunk_seconds apart, each at the quietest frame in the
+    search_seconds before its target, so chunks split in pauses rather than mid-word.
+    Returns the boundaries in samples, starting at 0 and ending at len(audio).
+    """
+    import numpy as np
+
+    frame_length = int(frame_seconds * sample_rate)
+    chunk_length = int(chunk_seconds * sample_rate)
+    search_length = int(search_seconds * sample_rate)
+
+    boundaries = [0]
+    target = chunk_length
+    # Don't leave a tiny last chunk, let the previous one run a little longer instead
+    while target < len(audio) - chunk_length // 4:
+        window_start = max(boundaries[-1] + frame_length, target - search_length)
+        num_frames = (target - window_start) // frame_length
+        if num_frames > 0:
+            frames = audio[window_start:window_start + num_frames * frame_length].reshape(num_frames, frame_length)
+            energy = np.einsum('ij,ij->i', frames, frames)
+            cut = window_start + int(np.argmin(energy)) * frame_length + frame_length // 2
+        else:
+            cut = target
+        boundaries.append(cut)
+        target = cut + chunk_length
+    boundaries.append(len(audio))
+    return boundaries
+
+def _transcribe_chunk(audio, offset, model_name, device, word_timestamps, options):
+    """
+    Transcribes one chunk and moves its timestamps onto the recording's timeline.
+    """
+    _, segments = transcribe_audio(audio, model_name, device, word_timestamps, options)
+    offset_seconds = offset / SAMPLE_RATE
+    for segment in segments:
+        segment['start'] += offset_seconds
+        segment['end'] += offset_seconds
+        segment['seek'] = segment.get('seek', 0) + offset // HOP_LENGTH
+        for word in segment.get('words', []):
+            word['start'] += offset_seconds
+            word['end'] += offset_seconds
+    return segments
+
+def create_chunk_executor(workers=None):
+    """
+    Creates the process pool chunked transcription runs its chunks in. Each
+    worker keeps the model it loaded, so a pool reused across files loads it
+    once per worker rather than once per file.
+    """
+    cpu_count = os.cpu_count() or 1
+    workers = workers or max(1, cpu_count // 4)
+    logger.info(f"Starting {workers} chunk transcription workers...")
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_cpu_stage_worker,
+        initargs=(max(1, cpu_count // workers),)
     )
 
-    transcription = result["text"]
-    segments = result["segments"]
-    logger.info("Transcription completed.")
+def transcribe_audio_chunked(audio, model_name="large-v3", device=None, word_timestamps=False, options=None, chunk_seconds=600.0, overlap_seconds=5.0, workers=None, executor=None):
+    """
+    Transcribes a long recording as overlapping chunks in a process pool and
+    stitches the segments back together into a single transcript. Returns the
+    same (transcription, segments) as transcribe_audio. The workers run on CPU
+    unless a device is given, so they don't each load a model onto one GPU.
+    executor is a pool from create_chunk_executor to reuse; without one, a pool
+    of workers processes is started for this recording.
+    """
+    if isinstance(audio, str):
+        audio = decode_audio(audio)
+    device = device or "cpu"
+
+    boundaries = find_chunk_boundaries(audio, chunk_seconds)
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    logger.info(f"Transcribing {len(boundaries) - 1} chunks...")
+
+    # Each chunk reaches overlap_seconds past its cut points so words on a boundary
+    # are heard in full by at least one of the two neighbouring chunks
+    windows = []
+    for chunk_start, chunk_end in zip(boundaries, boundaries[1:]):
+        window_start = max(0, chunk_start - overlap)
+        window_end = min(len(audio), chunk_end + overlap)
+        windows.append((window_start, window_end))
+
+    with ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(create_chunk_executor(workers))
+        chunk_results = executor.map(
+            _transcribe_chunk,
+            [audio[window_start:window_end] for window_start, window_end in windows],
+            [window_start for window_start, _ in windows],
+            [model_name] * len(windows),
+            [device] * len(windows),
+            [word_timestamps] * len(windows),
+            [options] * len(windows)
+        )
+
+        # Within an overlap keep each segment from the chunk that owns its midpoint
+        segments = []
+        for i, chunk_segments in enumerate(chunk_results):
+            chunk_start = boundaries[i] / SAMPLE_RATE
+            chunk_end = boundaries[i + 1] / SAMPLE_RATE
+            for segment in chunk_segments:
+                midpoint = (segment['start'] + segment['end']) / 2
+                if (i == 0 or midpoint >= chunk_start) and (i == len(windows) - 1 or midpoint < chunk_end):
+                    segment['id'] = len(segments)
+                    segments.append(segment)
+
+    transcription = "".join(segment['text'] for segment in segments)
+    logger.info("Chunked transcription completed.")
     return transcription, segments
 
 def convert_to_wav(input_file, output_file, downsample):
+    import ffmpeg
+
     logger.info(f"Converting {input_file} to {output_file}...")
     try:
         if downsample:
@@ -94,25 +375,205 @@ def convert_to_wav(input_file, output_file, downsample):
         logger.error(f"An error occurred during conversion: {e}")
         raise
 
-def diarize_audio(file_path, token, num_speakers):
-    logger.info("Starting diarization...")
-    retries = 3
-    for i in range(retries):
-        try:
+def decode_audio(input_file, sample_rate=SAMPLE_RATE, chunk_size=1 << 20):
+    """
+    Decodes any ffmpeg-readable file to mono float32 samples at sample_rate,
+    piping ffmpeg's output straight into memory instead of through a WAV file.
+    """
+    import ffmpeg
+    import numpy as np
+
+    logger.info(f"Decoding {input_file} in memory...")
+    process = (
+        ffmpeg
+        .input(input_file)
+        .output(
+            'pipe:',
+            format='s16le',
+            acodec='pcm_s16le',
+            ac=1,  # Mono
+            ar=sample_rate,
+            af='aresample=resampler=soxr',
+        )
+        .run_async(pipe_stdout=True)
+    )
+    buffer = bytearray()
+    while True:
+        chunk = process.stdout.read(chunk_size)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+    if process.wait() != 0:
+        logger.error(f"An error occurred while decoding {input_file}")
+        raise ffmpeg.Error('ffmpeg', None, None)
+
+    audio = np.frombuffer(buffer, np.int16).astype(np.float32) / 32768.0
+    logger.info(f"Decoding completed. {len(audio) / sample_rate:.1f}s of audio.")
+    return audio
+
+def write_wav(audio, output_file, sample_rate=SAMPLE_RATE):
+    """
+    Writes decoded float32 samples to a 16-bit mono WAV file.
+    """
+    import numpy as np
+
+    logger.info(f"Writing {output_file}...")
+    samples = (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(output_file, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.tobytes())
+
+def to_pyannote_input(audio, sample_rate=SAMPLE_RATE):
+    """
+    Wraps decoded samples in the in-memory waveform dict pyannote pipelines accept.
+    """
+    import torch
+
+    return {"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": sample_rate}
+
+def prepare_audio(audio_file_path, use_downsampled_audio=False, in_memory=False, keep_wav=False):
+    """
+    Returns the (transcription, diarization) inputs for an audio or video file.
+    On disk these are WAV paths, in memory both are the same decoded array.
+    """
+    file_root, file_extension = os.path.splitext(audio_file_path)
+    file_extension = file_extension.lower()
+
+    # Paths for the audio files
+    transcription_audio_path = audio_file_path  # Default to original file
+    diarization_audio_path = file_root + "_diarization.wav"
+
+    if in_memory:
+        # A single 16kHz mono decode is shared by Whisper and pyannote
+        audio = decode_audio(audio_file_path)
+        if keep_wav:
+            write_wav(audio, diarization_audio_path)
+        return audio, audio
+
+    # Convert video file to audio WAV file if necessary
+    if file_extension in [".mp4", ".mkv", ".avi", ".mov"]:
+        logger.info(f"Input file is a video. Extracting audio to WAV.")
+        audio_wav_path = file_root + ".wav"
+        if not os.path.exists(audio_wav_path):
+            convert_to_wav(audio_file_path, audio_wav_path, downsample=False)
+        else:
+            logger.info(f"WAV file already exists: {audio_wav_path}")
+        transcription_audio_path = audio_wav_path
+    else:
+        # If the file is an audio file but not WAV, convert to WAV without downsampling
+        if file_extension != ".wav":
+            logger.info(f"Converting {audio_file_path} to WAV format without downsampling.")
+            audio_wav_path = file_root + ".wav"
+            if not os.path.exists(audio_wav_path):
+                convert_to_wav(audio_file_path, audio_wav_path, downsample=False)
+            else:
+                logger.info(f"WAV file already exists: {audio_wav_path}")
+            transcription_audio_path = audio_wav_path
+
+    # Prepare the downsampled audio file for diarization
+    if not os.path.exists(diarization_audio_path):
+        convert_to_wav(transcription_audio_path, diarization_audio_path, downsample=True)
+    else:
+        logger.info(f"Diarization WAV file already exists: {diarization_audio_path}")
+
+    # If the user wants to use downsampled audio for transcription
+    if use_downsampled_audio:
+        transcription_audio_path = diarization_audio_path
+
+    return transcription_audio_path, diarization_audio_path
+
+def find_snapshot_path(snapshot_dir, model_id, filename):
+    """
+    Finds a file from a huggingface_hub snapshot_download(cache_dir=snapshot_dir)
+    of model_id, as done by download_model.py. Returns None if it isn't there.
+    """
+    pattern = os.path.join(snapshot_dir, "models--" + model_id.replace("/", "--"), "snapshots", "*", filename)
+    matches = glob.glob(pattern)
+    # Prefer the most recently downloaded revision
+    return max(matches, key=os.path.getmtime) if matches else None
+
+def build_offline_pipeline_config(snapshot_dir):
+    """
+    Writes a copy of the pipeline's config.yaml that points its segmentation and
+    embedding models at their local checkpoints instead of hub IDs, so loading
+    the pipeline needs no network access. Returns the copy's path.
+    """
+    import yaml
+
+    config_path = find_snapshot_path(snapshot_dir, DIARIZATION_MODEL, "config.yaml")
+    if config_path is None:
+        raise FileNotFoundError(f"No snapshot of {DIARIZATION_MODEL} in {snapshot_dir}, run download_model.py first")
+    with open(config_path, 'r', encoding='utf-8') as file:
+        config = yaml.safe_load(file)
+
+    params = config['pipeline']['params']
+    for param in ("segmentation", "embedding"):
+        model_id = params.get(param)
+        if isinstance(model_id, str) and not os.path.exists(model_id):
+            checkpoint_path = find_snapshot_path(snapshot_dir, model_id, "pytorch_model.bin")
+            if checkpoint_path is None:
+                raise FileNotFoundError(f"No snapshot of {model_id} in {snapshot_dir}, run download_model.py first")
+            params[param] = checkpoint_path
+
+    offline_config_path = os.path.join(os.path.dirname(config_path), "config.offline.yaml")
+    with open(offline_config_path, 'w', encoding='utf-8') as file:
+        yaml.safe_dump(config, file)
+    return offline_config_path
+
+def load_diarization_pipeline(token=None, device=None, snapshot_dir=None):
+    """
+    Builds the diarization pipeline once per process and device. With snapshot_dir
+    it is built from the local snapshot without touching the Hugging Face hub.
+    """
+    from pyannote.audio import Pipeline
+
+    device = get_device(device)
+    key = (DIARIZATION_MODEL, str(device))
+    with _model_cache_lock:
+        if key not in _model_cache:
             # Load the pretrained pipeline
-            pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token=token)
+            if snapshot_dir:
+                logger.info(f"Loading diarization pipeline from local snapshot in {snapshot_dir} to {device}...")
+                pipeline = Pipeline.from_pretrained(build_offline_pipeline_config(snapshot_dir))
+            else:
+                logger.info(f"Loading diarization pipeline {DIARIZATION_MODEL} to {device}...")
+                pipeline = Pipeline.from_pretrained(DIARIZATION_MODEL, use_auth_token=token)
             # Print available parameters
             logger.info(f"Pipeline parameters: {pipeline.parameters()}")
-            
+
             # Adjust chunking parameters
             pipeline.segmentation.duration = 30.0  # Chunk duration in seconds
             pipeline.segmentation.step = 5.0       # Step size in seconds (overlap)
 
-            # Move pipeline to GPU
-            pipeline.to(torch.device("cuda"))
+            # Move pipeline to GPU if available
+            pipeline.to(device)
+            _model_cache[key] = pipeline
+            _model_locks[key] = threading.Lock()
+        else:
+            logger.info(f"Reusing loaded diarization pipeline on {device}.")
+    return _model_cache[key]
+
+def diarize_audio(audio, token, num_speakers, device=None, snapshot_dir=None):
+    """
+    Diarizes a file path or a 16kHz mono float32 array from decode_audio.
+    """
+    import numpy as np
+
+    logger.info("Starting diarization...")
+    if isinstance(audio, np.ndarray):
+        audio = to_pyannote_input(audio)
+
+    # Loading isn't retried, a missing snapshot or bad token won't fix itself
+    pipeline = load_diarization_pipeline(token, device, snapshot_dir)
 
+    retries = 3
+    for i in range(retries):
+        try:
             # Run diarization
-            diarization = pipeline(file_path, num_speakers=num_speakers)
+            with _model_locks[(DIARIZATION_MODEL, str(get_device(device)))]:
+                diarization = pipeline(audio, num_speakers=num_speakers)
 
             logger.info("Diarization completed.")
             return diarization
@@ -124,11 +585,73 @@ def diarize_audio(file_path, token, num_speakers):
                 time.sleep(5)  # Wait before retrying
             else:
                 raise
-from pyannote.core import Segment
+class SpeakerIndex:
+    """
+    Finds the diarization turns each transcript segment overlaps with a sweep:
+    turns are taken in start order as the segments reach them and kept in a heap
+    by end time until the segments have moved past them. A segment only looks at
+    the turns still active around it, however long the longest turn is.
+    Segments are expected in start order, as Whisper emits them; one that
+    starts earlier than the previous one restarts the sweep.
+    """
 
-def align_timestamps(transcription_segments, diarization_result):
-    logger.info("Aligning transcription with diarization...")
-    aligned_results = []
+    def __init__(self, diarization_result):
+        # itertracks() already yields turns in (start, end) order, keep that order so
+        # ties between equally long overlaps resolve the same way as a full scan
+        self.turns = [(d_segment, speaker) for d_segment, _, speaker in diarization_result.itertracks(yield_label=True)]
+        self.reset()
+
+    def reset(self):
+        self.next_turn = 0
+        # (end, position in self.turns) of the turns that started before the sweep
+        self.active = []
+        self.last_start = float('-inf')
+
+    def overlapping(self, t_segment_obj):
+        """
+        Returns the turns that can overlap the segment, in itertracks() order.
+        """
+        if t_segment_obj.start < self.last_start:
+            self.reset()
+        self.last_start = t_segment_obj.start
+        while self.next_turn < len(self.turns) and self.turns[self.next_turn][0].start < t_segment_obj.end:
+            heapq.heappush(self.active, (self.turns[self.next_turn][0].end, self.next_turn))
+            self.next_turn += 1
+        # Turns that ended by this segment's start can't overlap it or any later segment
+        while self.active and self.active[0][0] <= t_segment_obj.start:
+            heapq.heappop(self.active)
+        return [self.turns[position] for position in sorted(position for _, position in self.active)]
+
+def build_speaker_index(diarization_result):
+    """
+    Builds the sweep index over the diarization turns so each transcript
+    segment only has to look at the turns it can overlap.
+    """
+    return SpeakerIndex(diarization_result)
+
+def find_speaker(speaker_index, t_segment_obj):
+    """
+    Returns the speaker with the longest overlap with the given segment, or "Unknown".
+    """
+    selected_speaker = "Unknown"
+    longest_overlap = None
+    for d_segment, speaker in speaker_index.overlapping(t_segment_obj):
+        if d_segment.intersects(t_segment_obj):
+            # Calculate overlap duration
+            overlap = (d_segment & t_segment_obj).duration
+            # Strictly greater keeps the first of equally long overlaps, like max()
+            if longest_overlap is None or overlap > longest_overlap:
+                longest_overlap = overlap
+                selected_speaker = speaker
+    return selected_speaker
+
+def iter_aligned_segments(transcription_segments, diarization_result):
+    """
+    Yields each transcript segment with its speaker as soon as it is aligned.
+    """
+    from pyannote.core import Segment
+
+    speaker_index = build_speaker_index(diarization_result)
 
     for t_segment in transcription_segments:
         t_start = t_segment['start']
@@ -136,31 +659,568 @@ def align_timestamps(transcription_segments, diarization_result):
         t_text = t_segment['text'].strip()
         t_segment_obj = Segment(t_start, t_end)
 
-        # Find overlapping diarization segments
-        overlapping_speakers = []
-        for track in diarization_result.itertracks(yield_label=True):
-            d_segment, _, speaker = track
-            if d_segment.intersects(t_segment_obj):
-                # Calculate overlap duration
-                overlap = d_segment & t_segment_obj
-                overlapping_speakers.append((overlap.duration, speaker))
-
-        if overlapping_speakers:
-            # Choose the speaker with the longest overlap duration
-            selected_speaker = max(overlapping_speakers, key=lambda x: x[0])[1]
-        else:
-            selected_speaker = "Unknown"
+        # Choose the speaker with the longest overlap duration
+        selected_speaker = find_speaker(speaker_index, t_segment_obj)
 
-        aligned_results.append({
+        yield {
             'start': t_start,
             'end': t_end,
             'speaker': selected_speaker,
             'text': t_text
-        })
+        }
 
+def align_timestamps(transcription_segments, diarization_result):
+    logger.info("Aligning transcription with diarization...")
+    aligned_results = list(iter_aligned_segments(transcription_segments, diarization_result))
     logger.info("Alignment completed.")
     return aligned_results
 
+def build_turn_arrays(diarization_result):
+    """
+    Returns the diarization turns as NumPy arrays of start and end times, an array
+    of label indices and the list of labels, in itertracks() order.
+    """
+    import numpy as np
+
+    turns = list(diarization_result.itertracks(yield_label=True))
+    labels = sorted({speaker for _, _, speaker in turns})
+    label_index = {speaker: i for i, speaker in enumerate(labels)}
+    starts = np.array([d_segment.start for d_segment, _, _ in turns], dtype=np.float64)
+    ends = np.array([d_segment.end for d_segment, _, _ in turns], dtype=np.float64)
+    speakers = np.array([label_index[speaker] for _, _, speaker in turns], dtype=np.int64)
+    return starts, ends, speakers, labels
+
+def find_word_speakers(word_starts, word_ends, turn_starts, turn_ends, turn_speakers, max_block_cells=1 << 20):
+    """
+    Returns, for every word, the label index of the turn it overlaps the longest,
+    or -1 if it overlaps none, the earliest turn winning ties. Each word is only
+    compared with the turns that start within a window before it, as long as all
+    but the longest 1% of turns, a block of words at a time with blocks small
+    enough that words x candidates stays within max_block_cells. The longest
+    turns, which would otherwise widen the window for every word, are each
+    compared with just the words in their own span instead.
+    """
+    import numpy as np
+
+    num_words = len(word_starts)
+    word_speakers = np.full(num_words, -1, dtype=np.int64)
+    if len(turn_starts) == 0 or num_words == 0:
+        return word_speakers
+    durations = turn_ends - turn_starts
+    window = np.quantile(durations, 0.99)
+    long_turns = np.flatnonzero(durations > window)
+    # Positions in itertracks() order, so the starts stay sorted
+    short_turns = np.flatnonzero(durations <= window)
+
+    best_overlap = np.zeros(num_words, dtype=np.float64)
+    best_turn = np.full(num_words, len(turn_starts), dtype=np.int64)
+
+    short_starts = turn_starts[short_turns]
+    first_turns = np.searchsorted(short_starts, word_starts - window, side='left')
+    last_turns = np.searchsorted(short_starts, word_ends, side='left')
+    num_candidates = int((last_turns - first_turns).max(initial=0))
+    block_size = max(1, max_block_cells // max(1, num_candidates))
+
+    for block_start in range(0, num_words if num_candidates else 0, block_size):
+        block = slice(block_start, block_start + block_size)
+        lo, hi = first_turns[block], last_turns[block]
+        # One row of candidate turns per word, padded past hi with masked entries
+        candidates = lo[:, None] + np.arange(num_candidates)
+        valid = candidates < hi[:, None]
+        candidates = short_turns[np.minimum(candidates, len(short_turns) - 1)]
+        overlap = np.minimum(turn_ends[candidates], word_ends[block, None]) - np.maximum(turn_starts[candidates], word_starts[block, None])
+        overlap[~valid] = 0.0
+        # argmax keeps the earliest turn on ties, like the segment-level alignment
+        best = np.argmax(overlap, axis=1)
+        rows = np.arange(len(best))
+        best_overlap[block] = np.maximum(overlap[rows, best], 0.0)
+        best_turn[block] = np.where(overlap[rows, best] > 0, candidates[rows, best], len(turn_starts))
+
+    if len(long_turns):
+        word_order = np.argsort(word_starts, kind='stable')
+        sorted_starts = word_starts[word_order]
+        max_word_duration = (word_ends - word_starts).max()
+        for turn in long_turns.tolist():
+            # Only words starting less than the longest word before the turn can reach into it
+            lo = np.searchsorted(sorted_starts, turn_starts[turn] - max_word_duration, side='right')
+            hi = np.searchsorted(sorted_starts, turn_ends[turn], side='left')
+            words = word_order[lo:hi]
+            overlap = np.minimum(turn_ends[turn], word_ends[words]) - np.maximum(turn_starts[turn], word_starts[words])
+            better = (overlap > 0) & ((overlap > best_overlap[words]) | ((overlap == best_overlap[words]) & (turn < best_turn[words])))
+            best_overlap[words[better]] = overlap[better]
+            best_turn[words[better]] = turn
+
+    attributed = best_turn < len(turn_starts)
+    word_speakers[attributed] = turn_speakers[best_turn[attributed]]
+    return word_speakers
+
+def align_words(transcription_segments, diarization_result):
+    """
+    Attributes a speaker to every word using Whisper's word timestamps and splits
+    segments wherever the speaker changes. Words in gaps between turns take the
+    speaker of the nearest attributed word in the same segment. Segments without
+    word timestamps are treated as a single word. Returns dicts shaped like
+    align_timestamps() results.
+    """
+    import numpy as np
+
+    logger.info("Aligning words with diarization...")
+    word_texts = []
+    word_starts = []
+    word_ends = []
+    word_segments = []
+    for segment_id, t_segment in enumerate(transcription_segments):
+        words = t_segment.get('words') or [{'word': t_segment['text'], 'start': t_segment['start'], 'end': t_segment['end']}]
+        for word in words:
+            word_texts.append(word['word'])
+            word_starts.append(word['start'])
+            word_ends.append(word['end'])
+            word_segments.append(segment_id)
+    if not word_texts:
+        return []
+
+    word_starts = np.array(word_starts, dtype=np.float64)
+    word_ends = np.array(word_ends, dtype=np.float64)
+    word_segments = np.array(word_segments, dtype=np.int64)
+    turn_starts, turn_ends, turn_speakers, labels = build_turn_arrays(diarization_result)
+    speakers = find_word_speakers(word_starts, word_ends, turn_starts, turn_ends, turn_speakers)
+
+    # Fill unattributed words from the closer in time of the previous and next
+    # attributed words in the segment, the previous one on ties
+    positions = np.arange(len(speakers))
+    known = speakers >= 0
+    previous_known = np.maximum.accumulate(np.where(known, positions, -1))
+    clipped_previous = np.maximum(previous_known, 0)
+    has_previous = ~known & (previous_known >= 0) & (word_segments[clipped_previous] == word_segments)
+    next_known = np.minimum.accumulate(np.where(known, positions, len(speakers))[::-1])[::-1]
+    clipped_next = np.minimum(next_known, len(speakers) - 1)
+    has_next = ~known & (next_known < len(speakers)) & (word_segments[clipped_next] == word_segments)
+    previous_gap = word_starts - word_ends[clipped_previous]
+    next_gap = word_starts[clipped_next] - word_ends
+    use_previous = has_previous & (~has_next | (previous_gap <= next_gap))
+    use_next = has_next & ~use_previous
+    filled = speakers.copy()
+    filled[use_previous] = speakers[previous_known[use_previous]]
+    filled[use_next] = speakers[next_known[use_next]]
+
+    # Start a new aligned segment at every speaker or segment change
+    changes = np.flatnonzero((filled[1:] != filled[:-1]) | (word_segments[1:] != word_segments[:-1])) + 1
+    group_starts = np.concatenate(([0], changes))
+    group_ends = np.concatenate((changes, [len(filled)]))
+
+    aligned_results = []
+    for first, last in zip(group_starts.tolist(), group_ends.tolist()):
+        speaker = filled[first]
+        aligned_results.append({
+            'start': float(word_starts[first]),
+            'end': float(word_ends[last - 1]),
+            'speaker': labels[speaker] if speaker >= 0 else "Unknown",
+            'text': "".join(word_texts[first:last]).strip()
+        })
+    logger.info(f"Word alignment completed: {len(word_texts)} words in {len(aligned_results)} segments.")
+    return aligned_results
+
+def segment_position(start, end):
+    """
+    Returns a segment's place in the output as whole milliseconds, the precision
+    SRT and WebVTT keep, so positions read back from a file compare exactly.
+    """
+    return int(round(start * 1000)), int(round(end * 1000))
+
+class SegmentWriter:
+    """
+    Writes aligned segments to a file one at a time, flushing after each so other
+    processes can tail it. With resume=True an existing file is appended to,
+    after dropping any half-written entry, and segments up to the last one
+    already in the file are skipped. Segments come in start order but may end
+    out of order, so the position is the last entry's (start, end) to the
+    millisecond rather than its end alone. A fresh file gets every segment.
+    """
+    extension = None
+    # What every complete entry ends with
+    entry_terminator = "\n"
+
+    def __init__(self, file_path, resume=False):
+        self.file_path = file_path
+        self.count = 0
+        # (start, end) in milliseconds of the last segment an earlier run wrote
+        self.resume_after = None
+        if resume and os.path.exists(file_path):
+            self._load_progress()
+            self.file = open(file_path, 'a', encoding='utf-8')
+            logger.info(f"Resuming {file_path} after {self.count} segments.")
+        else:
+            self.file = open(file_path, 'w', encoding='utf-8')
+            self.file.write(self.header())
+            self.file.flush()
+
+    def _load_progress(self):
+        with open(self.file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+        header = self.header()
+        entries = content[len(header):] if content.startswith(header) else ""
+        # Cut off the entry that was being written when the last run died
+        entries = entries[:entries.rfind(self.entry_terminator) + len(self.entry_terminator)] if self.entry_terminator in entries else ""
+        if header + entries != content:
+            with open(self.file_path, 'w', encoding='utf-8') as file:
+                file.write(header + entries)
+        self.count, last_times = self.read_progress(entries)
+        if last_times is not None:
+            self.resume_after = segment_position(*last_times)
+
+    def header(self):
+        return ""
+
+    def read_progress(self, content):
+        """
+        Returns the number of entries in content and the (start, end) times of
+        the last one, or None if there are none.
+        """
+        raise NotImplementedError
+
+    def format_segment(self, index, segment):
+        raise NotImplementedError
+
+    def write(self, segment):
+        if self.resume_after is not None and segment_position(segment['start'], segment['end']) <= self.resume_after:
+            return
+        self.count += 1
+        self.file.write(self.format_segment(self.count, segment))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class JsonlSegmentWriter(SegmentWriter):
+    extension = ".jsonl"
+
+    def read_progress(self, content):
+        lines = content.splitlines()
+        if not lines:
+            return 0, None
+        last = json.loads(lines[-1])
+        return len(lines), (last['start'], last['end'])
+
+    def format_segment(self, index, segment):
+        return json.dumps(segment, ensure_ascii=False) + "\n"
+
+def format_timestamp(seconds, decimal_marker):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
+
+def parse_timestamp(timestamp):
+    hours, minutes, seconds = timestamp.replace(",", ".").split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+# Matches the start and end times of an SRT or WebVTT cue timing line
+CUE_TIMES_PATTERN = re.compile(r"(\d+:\d{2}:\d{2}[,.]\d{3}) --> (\d+:\d{2}:\d{2}[,.]\d{3})")
+
+class SrtSegmentWriter(SegmentWriter):
+    extension = ".srt"
+    entry_terminator = "\n\n"
+    decimal_marker = ","
+
+    def read_progress(self, content):
+        cue_times = CUE_TIMES_PATTERN.findall(content)
+        if not cue_times:
+            return 0, None
+        start, end = cue_times[-1]
+        return len(cue_times), (parse_timestamp(start), parse_timestamp(end))
+
+    def format_cue_text(self, segment):
+        return f"[{segment['speaker']}] {segment['text']}"
+
+    def format_segment(self, index, segment):
+        start = format_timestamp(segment['start'], self.decimal_marker)
+        end = format_timestamp(segment['end'], self.decimal_marker)
+        return f"{index}\n{start} --> {end}\n{self.format_cue_text(segment)}\n\n"
+
+class VttSegmentWriter(SrtSegmentWriter):
+    extension = ".vtt"
+    decimal_marker = "."
+
+    def header(self):
+        return "WEBVTT\n\n"
+
+    def format_cue_text(self, segment):
+        # WebVTT voice spans carry the speaker
+        return f"<v {segment['speaker']}>{segment['text']}"
+
+SEGMENT_WRITERS = {
+    "jsonl": JsonlSegmentWriter,
+    "srt": SrtSegmentWriter,
+    "vtt": VttSegmentWriter,
+}
+
+def hash_file(file_path, block_size=1 << 20):
+    """
+    Returns the SHA-256 of a file's content, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def make_cache_key(content_hash, stage, **params):
+    """
+    Combines the audio content hash with the stage name and every parameter that
+    changes the stage's output into one cache key.
+    """
+    key_data = json.dumps({'content': content_hash, 'stage': stage, **params}, sort_keys=True)
+    return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+def load_cached_result(cache_dir, key):
+    cache_path = os.path.join(cache_dir, key[:2], key + ".json")
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path, 'r', encoding='utf-8') as file:
+        result = json.load(file)
+    # Mark the entry as recently used so eviction removes it last
+    os.utime(cache_path)
+    logger.info(f"Loaded cached {result['stage']} result from {cache_path}")
+    return result['data']
+
+def store_cached_result(cache_dir, key, stage, data, max_bytes):
+    cache_path = os.path.join(cache_dir, key[:2], key + ".json")
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = cache_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        # Whisper can leave NumPy scalars in its segments
+        json.dump({'stage': stage, 'data': data}, file, default=float)
+    os.replace(temp_path, cache_path)
+    logger.info(f"Cached {stage} result in {cache_path}")
+    evict_cache(cache_dir, max_bytes)
+
+def evict_cache(cache_dir, max_bytes):
+    """
+    Removes the least recently used cache entries until the cache fits in max_bytes.
+    """
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(".json"):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        os.remove(path)
+        total_bytes -= size
+        logger.info(f"Evicted cache entry {path}")
+
+def annotation_to_json(annotation):
+    return {
+        'uri': annotation.uri,
+        'tracks': [[d_segment.start, d_segment.end, track, speaker] for d_segment, track, speaker in annotation.itertracks(yield_label=True)]
+    }
+
+def annotation_from_json(data):
+    from pyannote.core import Annotation, Segment
+
+    annotation = Annotation(uri=data['uri'])
+    for start, end, track, speaker in data['tracks']:
+        annotation[Segment(start, end), track] = speaker
+    return annotation
+
+def run_stage(executor, stage_name, func, *args):
+    """
+    Starts a measured stage in the executor, or runs it right away when there is
+    no executor. Returns a Future of (result, stage metrics) either way.
+    """
+    if executor is not None:
+        return executor.submit(run_timed_stage, stage_name, func, *args)
+    future = Future()
+    try:
+        future.set_result(run_timed_stage(stage_name, func, *args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def get_process_peak_rss_mb():
+    """
+    Returns the peak resident memory of this process over its whole lifetime in
+    MB, or None where unsupported.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def get_rss_mb():
+    """
+    Returns the current resident memory of this process in MB, or None where
+    /proc isn't available.
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class RssSampler:
+    """
+    Polls this process's resident memory from a background thread while the
+    block runs and keeps the highest value seen, so each stage gets its own peak
+    rather than the process's all-time one. peak stays None where RSS can't be read.
+    """
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = get_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        return False
+
+def get_audio_duration(audio):
+    """
+    Returns the duration in seconds of a decoded array or an ffmpeg-readable file.
+    """
+    if not isinstance(audio, str):
+        return len(audio) / SAMPLE_RATE
+    import ffmpeg
+
+    return float(ffmpeg.probe(audio)['format']['duration'])
+
+@contextmanager
+def measure_stage(stage_name, stage_metrics):
+    """
+    Measures wall time, CPU time (including finished child processes) and peak
+    memory of the code in the block, and fills them into stage_metrics.
+    peak_rss_mb is sampled while the block runs; process_peak_rss_mb is the
+    process's lifetime peak, which is all there is where /proc is missing.
+    Stages running side by side in threads share a process, so their RSS
+    peaks overlap.
+    """
+    # Only look at GPU memory when something already brought in torch
+    torch = sys.modules.get("torch")
+    use_cuda = torch is not None and torch.cuda.is_available()
+    if use_cuda:
+        torch.cuda.reset_peak_memory_stats()
+    start_wall = time.perf_counter()
+    start_cpu = sum(os.times()[:4])
+    with RssSampler() as rss_sampler:
+        yield stage_metrics
+    stage_metrics.update({
+        'stage': stage_name,
+        'wall_seconds': time.perf_counter() - start_wall,
+        'cpu_seconds': sum(os.times()[:4]) - start_cpu,
+        'peak_rss_mb': rss_sampler.peak,
+        'process_peak_rss_mb': get_process_peak_rss_mb(),
+        'peak_gpu_mb': torch.cuda.max_memory_allocated() / (1024 * 1024) if use_cuda else None,
+    })
+
+def run_timed_stage(stage_name, func, *args):
+    """
+    Runs one pipeline stage and returns its result with the stage's metrics.
+    The metrics are taken where the stage runs, so a stage in a worker process
+    reports that process's CPU time and memory.
+    """
+    with measure_stage(stage_name, {}) as stage_metrics:
+        result = func(*args)
+    return result, stage_metrics
+
+class PipelineMetrics:
+    """
+    Collects per-stage metrics for one file and writes them as a JSON report.
+    """
+    def __init__(self, audio_file_path, **settings):
+        self.audio_file_path = audio_file_path
+        self.settings = settings
+        self.audio_duration = None
+        self.stages = []
+
+    def add(self, stage_metrics):
+        self.stages.append(stage_metrics)
+        logger.info(f"{stage_metrics['stage'].capitalize()} took {stage_metrics['wall_seconds']:.2f}s")
+
+    @contextmanager
+    def stage(self, stage_name):
+        with measure_stage(stage_name, {}) as stage_metrics:
+            yield
+        self.add(stage_metrics)
+
+    def write_report(self, report_path):
+        # The duration is only known once the audio is decoded, after the
+        # conversion stage was added, so every stage gets it here
+        for stage_metrics in self.stages:
+            stage_metrics['audio_duration'] = self.audio_duration
+            stage_metrics['real_time_factor'] = stage_metrics['wall_seconds'] / self.audio_duration if self.audio_duration else None
+        total_wall = sum(stage['wall_seconds'] for stage in self.stages)
+        report = {
+            'file': self.audio_file_path,
+            'settings': self.settings,
+            'audio_duration': self.audio_duration,
+            'stages': self.stages,
+            'total_wall_seconds': total_wall,
+            'total_real_time_factor': total_wall / self.audio_duration if self.audio_duration else None,
+        }
+        with open(report_path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        logger.info(f"Metrics saved to {report_path}")
+
+def _init_cpu_stage_worker(num_threads):
+    try:
+        import torch
+    except ImportError:
+        return  # Nothing to split, e.g. chunks for the stub engine without torch installed
+
+    # Split the cores between the transcription and diarization processes
+    torch.set_num_threads(num_threads)
+
+def create_stage_executor(device=None):
+    """
+    Creates the executor that runs transcription and diarization side by side.
+    On CPU the stages get separate processes, each with half of the cores, since
+    they would otherwise compete for the same interpreter and thread pool. On GPU
+    threads are enough as the heavy lifting happens outside the GIL.
+    """
+    if get_device(device).type == "cpu":
+        num_threads = max(1, (os.cpu_count() or 2) // 2)
+        logger.info(f"Running transcription and diarization in separate processes with {num_threads} threads each.")
+        return ProcessPoolExecutor(
+            max_workers=2,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_cpu_stage_worker,
+            initargs=(num_threads,)
+        )
+    logger.info("Running transcription and diarization in separate threads.")
+    return ThreadPoolExecutor(max_workers=2)
+
 def save_results_to_file(transcription, aligned_results, output_file_path):
     logger.info(f"Saving results to {output_file_path}...")
     with open(output_file_path, 'w', encoding='utf-8') as file:
@@ -171,93 +1231,397 @@ def save_results_to_file(transcription, aligned_results, output_file_path):
             file.write(f"Speaker {result['speaker']} from {result['start']} to {result['end']}: {result['text']}\n")
     logger.info("Results saved.")
 
-def main():
-    parser = argparse.ArgumentParser(description="Transcribe audio and identify speakers.")
-    parser.add_argument("filepath", type=str, help="Path to the audio file")
-    parser.add_argument("token", type=str, help="Hugging Face access token")
-    parser.add_argument("num_speakers", type=int, help="Number of speakers")
-    parser.add_argument("--use_downsampled_audio", action="store_true", default=False, help="Use downsampled audio (16kHz mono) for transcription to improve speed")
-
-    args = parser.parse_args()
-    audio_file_path = args.filepath
+def align_and_stream(transcription_segments, diarization_result, output_root, word_alignment=False, stream_formats=(), resume_output=False):
+    """
+    Aligns the transcript with the diarization, writing each aligned segment to
+    output_root + "_aligned.<format>" for every stream format as it is produced.
+    Returns the aligned segments.
+    """
+    with ExitStack() as stack:
+        writers = [
+            stack.enter_context(SEGMENT_WRITERS[stream_format](
+                output_root + "_aligned" + SEGMENT_WRITERS[stream_format].extension,
+                resume_output
+            ))
+            for stream_format in stream_formats
+        ]
+        if word_alignment:
+            aligned_segments = align_words(transcription_segments, diarization_result)
+        else:
+            aligned_segments = iter_aligned_segments(transcription_segments, diarization_result)
+        aligned_results = []
+        for aligned_segment in aligned_segments:
+            aligned_results.append(aligned_segment)
+            for writer in writers:
+                writer.write(aligned_segment)
+    return aligned_results
+
+def process_file(audio_file_path, args, stage_executor=None, chunk_executor=None):
+    """
+    Runs the full pipeline on one file with the options parsed by main().
+    stage_executor (from create_stage_executor) and chunk_executor (from
+    create_chunk_executor) are pools to reuse for --concurrent and --chunked,
+    so a batch keeps their workers' models loaded; without them the file gets
+    its own pools.
+    """
     hf_token = args.token
+    diarization_snapshot = args.diarization_snapshot
     num_speakers = args.num_speakers
     use_downsampled_audio = args.use_downsampled_audio
+    in_memory = args.in_memory
+    keep_wav = args.keep_wav
+    concurrent = args.concurrent
+    chunked = args.chunked
+    chunk_seconds = args.chunk_seconds
+    chunk_overlap = args.chunk_overlap
+    chunk_workers = args.chunk_workers
+    cache_dir = args.cache_dir
+    cache_max_bytes = int(args.cache_max_gb * 1024 ** 3)
+    model_name = args.model
+    device = args.device
+    transcribe_options = {'engine': args.engine, 'beam_size': args.beam_size, 'best_of': args.best_of, 'temperature': args.temperature}
+    output_dir = args.output_dir
+    write_metrics = args.metrics
+    stream_formats = args.stream_formats
+    word_alignment = args.word_alignment
+    resume_output = args.resume_output
 
-    check_gpu()
+    # Get the base filename, outputs are written next to each other in output_dir
+    base_filename = os.path.splitext(os.path.basename(audio_file_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
 
-    # Get the base filename and file extension
-    base_filename = os.path.basename(audio_file_path)
-    file_root, file_extension = os.path.splitext(audio_file_path)
-    file_extension = file_extension.lower()
+    metrics = PipelineMetrics(audio_file_path, engine=args.engine, model=model_name, device=str(get_engine_device(args.engine, device)), in_memory=in_memory, concurrent=concurrent, chunked=chunked)
 
-    # Paths for the audio files
-    transcription_audio_path = audio_file_path  # Default to original file
-    diarization_audio_path = file_root + "_diarization.wav"
+    cached_transcription = None
+    cached_diarization = None
+    if cache_dir:
+        content_hash = hash_file(audio_file_path)
+        decode_params = {'in_memory': in_memory, 'use_downsampled_audio': use_downsampled_audio}
+        # fp16 on CUDA and fp32 on CPU give different segments; chunk workers run on CPU unless told otherwise
+        transcription_device = str(get_engine_device(args.engine, "cpu" if chunked and device is None else device))
+        transcription_params = {'model': model_name, 'device': transcription_device, 'chunked': chunked, 'word_timestamps': word_alignment, **transcribe_options}
+        if chunked:
+            transcription_params.update(chunk_seconds=chunk_seconds, chunk_overlap=chunk_overlap)
+        transcription_key = make_cache_key(content_hash, "transcription", **decode_params, **transcription_params)
+        diarization_key = make_cache_key(content_hash, "diarization", **decode_params, pipeline=DIARIZATION_MODEL, num_speakers=num_speakers)
+        cached_transcription = load_cached_result(cache_dir, transcription_key)
+        cached_diarization = load_cached_result(cache_dir, diarization_key)
 
-    # Step 1: Convert video file to audio WAV file if necessary
-    if file_extension in [".mp4", ".mkv", ".avi", ".mov"]:
-        logger.info(f"Input file is a video. Extracting audio to WAV.")
-        audio_wav_path = file_root + ".wav"
-        if not os.path.exists(audio_wav_path):
-            convert_to_wav(audio_file_path, audio_wav_path, downsample=False)
-        else:
-            logger.info(f"WAV file already exists: {audio_wav_path}")
-        transcription_audio_path = audio_wav_path
+    # Step 1: Convert or decode the input into audio for transcription and diarization
+    if cached_transcription is None or cached_diarization is None:
+        with metrics.stage("conversion"):
+            transcription_audio, diarization_audio = prepare_audio(audio_file_path, use_downsampled_audio, in_memory, keep_wav)
+        if write_metrics:
+            metrics.audio_duration = get_audio_duration(diarization_audio)
     else:
-        # If the file is an audio file but not WAV, convert to WAV without downsampling
-        if file_extension != ".wav":
-            logger.info(f"Converting {audio_file_path} to WAV format without downsampling.")
-            audio_wav_path = file_root + ".wav"
-            if not os.path.exists(audio_wav_path):
-                convert_to_wav(audio_file_path, audio_wav_path, downsample=False)
-            else:
-                logger.info(f"WAV file already exists: {audio_wav_path}")
-            transcription_audio_path = audio_wav_path
+        logger.info("Both stages are cached, skipping audio conversion.")
+        transcription_audio = diarization_audio = None
 
-    # Prepare the downsampled audio file for diarization
-    if not os.path.exists(diarization_audio_path):
-        convert_to_wav(transcription_audio_path, diarization_audio_path, downsample=True)
+    if chunked:
+        transcribe_stage = (transcribe_audio_chunked, transcription_audio, model_name, device, word_alignment, transcribe_options, chunk_seconds, chunk_overlap, chunk_workers, chunk_executor)
     else:
-        logger.info(f"Diarization WAV file already exists: {diarization_audio_path}")
-
-    # If the user wants to use downsampled audio for transcription
-    if use_downsampled_audio:
-        transcription_audio_path = diarization_audio_path
+        transcribe_stage = (transcribe_audio, transcription_audio, model_name, device, word_alignment, transcribe_options)
+    diarize_stage = (diarize_audio, diarization_audio, hf_token, num_speakers, device, diarization_snapshot)
 
+    executor = None
+    if concurrent and cached_transcription is None and cached_diarization is None:
+        executor = stage_executor or create_stage_executor(device)
+    # Chunked transcription only hands chunks to its own pool, so it runs here
+    # alongside the diarization worker instead of nesting a pool inside a stage worker
+    transcription_executor = None if chunked else executor
     try:
+        # Load the models up front so their load time is reported on its own.
+        # Worker processes load their own copies inside the stage instead.
+        if executor is None or isinstance(executor, ThreadPoolExecutor):
+            with metrics.stage("model_load"):
+                if cached_transcription is None and not chunked:
+                    load_transcription_engine(transcribe_options['engine'], model_name, device)
+                if cached_diarization is None:
+                    load_diarization_pipeline(hf_token, device, diarization_snapshot)
+
         # Step 2: Transcribe audio
-        start_time = datetime.now()
-        transcription, transcription_segments = transcribe_audio(transcription_audio_path)
-        end_time = datetime.now()
-        logger.info(f"Transcription took {end_time - start_time}")
+        diarization_future = None
+        if executor is not None:
+            # Diarization runs in its own worker while transcription runs in another
+            diarization_future = run_stage(executor, "diarization", *diarize_stage)
+
+        if cached_transcription is None:
+            (transcription, transcription_segments), stage_metrics = run_stage(transcription_executor, "transcription", *transcribe_stage).result()
+            metrics.add(stage_metrics)
+            if cache_dir:
+                store_cached_result(cache_dir, transcription_key, "transcription", {'text': transcription, 'segments': transcription_segments}, cache_max_bytes)
+        else:
+            transcription, transcription_segments = cached_transcription['text'], cached_transcription['segments']
 
         # Save transcription to prevent work loss
-        transcription_file_path = os.path.splitext(base_filename)[0] + "_transcription.txt"
+        transcription_file_path = os.path.join(output_dir, base_filename + "_transcription.txt")
         with open(transcription_file_path, 'w', encoding='utf-8') as file:
             file.write(transcription)
         logger.info(f"Transcription saved to {transcription_file_path}")
 
         # Step 3: Diarize audio
-        start_time = datetime.now()
-        diarization_result = diarize_audio(diarization_audio_path, hf_token, num_speakers)
-        end_time = datetime.now()
-        logger.info(f"Diarization took {end_time - start_time}")
-        
-        # Step 4: Align transcription with diarization
-        start_time = datetime.now()
-        aligned_results = align_timestamps(transcription_segments, diarization_result)
-        end_time = datetime.now()
-        logger.info(f"Alignment took {end_time - start_time}")
-        
+        if cached_diarization is None:
+            if diarization_future is None:
+                diarization_future = run_stage(None, "diarization", *diarize_stage)
+            diarization_result, stage_metrics = diarization_future.result()
+            metrics.add(stage_metrics)
+            if cache_dir:
+                store_cached_result(cache_dir, diarization_key, "diarization", annotation_to_json(diarization_result), cache_max_bytes)
+        else:
+            diarization_result = annotation_from_json(cached_diarization)
+
+        # Step 4: Align transcription with diarization, streaming each aligned
+        # segment to the requested formats as it is produced
+        with metrics.stage("alignment"):
+            aligned_results = align_and_stream(
+                transcription_segments, diarization_result, os.path.join(output_dir, base_filename),
+                word_alignment, stream_formats, resume_output
+            )
+
         # Step 5: Save results to a .txt file
-        output_file_path = os.path.splitext(base_filename)[0] + "_aligned_transcription.txt"
-        save_results_to_file(transcription, aligned_results, output_file_path)
+        output_file_path = os.path.join(output_dir, base_filename + "_aligned_transcription.txt")
+        with metrics.stage("saving"):
+            save_results_to_file(transcription, aligned_results, output_file_path)
         logger.info(f"Results saved to {output_file_path}")
-    
+
     except Exception as e:
         logger.error(f"An error occurred: {e}")
         logger.info("Intermediate results have been saved.")
+        raise
+    finally:
+        if executor is not None and executor is not stage_executor:
+            executor.shutdown()
+        if write_metrics:
+            metrics.write_report(os.path.join(output_dir, base_filename + "_metrics.json"))
+
+# Extensions picked up when a batch input is a directory
+MEDIA_EXTENSIONS = {".wav", ".mp3", ".m4a", ".flac", ".ogg", ".opus", ".webm", ".mp4", ".mkv", ".avi", ".mov"}
+
+def resolve_batch_inputs(input_spec):
+    """
+    Expands a batch input into a sorted list of files. The input can be a
+    directory, a glob pattern, or a manifest .txt file with one path per line.
+    """
+    if os.path.isdir(input_spec):
+        paths = [os.path.join(input_spec, name) for name in os.listdir(input_spec) if os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS]
+        # Skip the WAV files this script derives from other inputs
+        roots = {os.path.splitext(path)[0] for path in paths if not path.lower().endswith(".wav")}
+        paths = [
+            path for path in paths
+            if not path.endswith("_diarization.wav") and not (path.lower().endswith(".wav") and os.path.splitext(path)[0] in roots)
+        ]
+    elif input_spec.endswith(".txt"):
+        with open(input_spec, 'r', encoding='utf-8') as file:
+            paths = [line.strip() for line in file if line.strip() and not line.startswith("#")]
+    else:
+        paths = glob.glob(input_spec, recursive=True)
+    return sorted(paths)
+
+def load_batch_status(status_file):
+    if not os.path.exists(status_file):
+        return {}
+    with open(status_file, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def save_batch_status(status, status_file):
+    # Write to a temporary file first so a crash never leaves a truncated manifest
+    temp_path = status_file + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(status, file, indent=2)
+    os.replace(temp_path, status_file)
+
+def run_batch(args):
+    """
+    Processes every file in a batch input with a bounded pool of worker threads.
+    Models stay loaded across files, and a status manifest records each file's
+    progress so a crashed batch resumes with the files that didn't finish.
+    """
+    paths = resolve_batch_inputs(args.filepath)
+    os.makedirs(args.output_dir, exist_ok=True)
+    status_file = args.status_file or os.path.join(args.output_dir, "batch_status.json")
+    status = load_batch_status(status_file)
+    status_lock = threading.Lock()
+
+    pending = [path for path in paths if status.get(path, {}).get('status') != "done"]
+    logger.info(f"Batch of {len(paths)} files, {len(paths) - len(pending)} already done, {len(pending)} to process.")
+
+    def update_status(path, state, error=None):
+        with status_lock:
+            status[path] = {'status': state, 'updated': datetime.now().isoformat(timespec='seconds')}
+            if error:
+                status[path]['error'] = error
+            save_batch_status(status, status_file)
+
+    def process_batch_file(path):
+        update_status(path, "running")
+        try:
+            process_file(path, args, stage_executor, chunk_executor)
+        except Exception as e:
+            update_status(path, "failed", str(e))
+            return False
+        update_status(path, "done")
+        return True
+
+    # Threads share the loaded models; each model runs one file at a time while
+    # the other workers decode audio or use the other model. The stage and chunk
+    # pools are shared too, so their worker processes load their models once
+    with ExitStack() as stack:
+        stage_executor = stack.enter_context(create_stage_executor(args.device)) if args.concurrent and pending else None
+        chunk_executor = stack.enter_context(create_chunk_executor(args.chunk_workers)) if args.chunked and pending else None
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(process_batch_file, pending))
+
+    logger.info(f"Batch completed: {sum(results)} succeeded, {len(results) - sum(results)} failed. Status saved to {status_file}")
+
+def get_output_root(file_path, output_dir, suffix=""):
+    """
+    Returns output_dir joined with the file's name, minus its extension and suffix.
+    """
+    base_filename = os.path.splitext(os.path.basename(file_path))[0]
+    if suffix and base_filename.endswith(suffix):
+        base_filename = base_filename[:-len(suffix)]
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, base_filename)
+
+def write_json(data, output_file_path):
+    with open(output_file_path, 'w', encoding='utf-8') as file:
+        # Whisper can leave NumPy scalars in its segments
+        json.dump(data, file, ensure_ascii=False, default=float)
+    logger.info(f"Saved {output_file_path}")
+
+def read_json(input_file_path):
+    with open(input_file_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def convert_command(args):
+    transcription_audio_path, diarization_audio_path = prepare_audio(args.filepath)
+    logger.info(f"Transcription audio: {transcription_audio_path}")
+    logger.info(f"Diarization audio: {diarization_audio_path}")
+
+def transcribe_command(args):
+    check_gpu()
+    transcription_audio, _ = prepare_audio(args.filepath, args.use_downsampled_audio, args.in_memory, args.keep_wav)
+    transcribe_options = {'engine': args.engine, 'beam_size': args.beam_size, 'best_of': args.best_of, 'temperature': args.temperature}
+    if args.chunked:
+        transcription, segments = transcribe_audio_chunked(
+            transcription_audio, args.model, args.device, args.word_alignment, transcribe_options,
+            args.chunk_seconds, args.chunk_overlap, args.chunk_workers
+        )
+    else:
+        transcription, segments = transcribe_audio(transcription_audio, args.model, args.device, args.word_alignment, transcribe_options)
+
+    output_root = get_output_root(args.filepath, args.output_dir)
+    with open(output_root + "_transcription.txt", 'w', encoding='utf-8') as file:
+        file.write(transcription)
+    write_json({'text': transcription, 'segments': segments}, output_root + "_segments.json")
+
+def diarize_command(args):
+    check_gpu()
+    _, diarization_audio = prepare_audio(args.filepath, in_memory=args.in_memory, keep_wav=args.keep_wav)
+    diarization_result = diarize_audio(diarization_audio, args.token, args.num_speakers, args.device, args.diarization_snapshot)
+    write_json(annotation_to_json(diarization_result), get_output_root(args.filepath, args.output_dir) + "_diarization.json")
+
+def align_command(args):
+    transcription_result = read_json(args.segments)
+    diarization_result = annotation_from_json(read_json(args.diarization))
+    output_root = get_output_root(args.segments, args.output_dir, "_segments")
+    aligned_results = align_and_stream(
+        transcription_result['segments'], diarization_result, output_root,
+        args.word_alignment, args.stream_formats, args.resume_output
+    )
+    save_results_to_file(transcription_result['text'], aligned_results, output_root + "_aligned_transcription.txt")
+
+def run_command(args):
+    check_gpu()
+    if args.batch:
+        run_batch(args)
+    else:
+        process_file(args.filepath, args)
+
+SUBCOMMANDS = {
+    "convert": convert_command,
+    "transcribe": transcribe_command,
+    "diarize": diarize_command,
+    "align": align_command,
+    "run": run_command,
+}
+
+def build_parser():
+    # Option groups shared between the subcommands
+    output_options = argparse.ArgumentParser(add_help=False)
+    output_options.add_argument("--output_dir", type=str, default=".", help="Directory to write the outputs to")
+
+    audio_options = argparse.ArgumentParser(add_help=False)
+    audio_options.add_argument("--use_downsampled_audio", action="store_true", default=False, help="Use downsampled audio (16kHz mono) for transcription to improve speed")
+    audio_options.add_argument("--in_memory", action="store_true", default=False, help="Decode the input once to 16kHz mono in memory instead of writing intermediate WAV files")
+    audio_options.add_argument("--keep_wav", action="store_true", default=False, help="With --in_memory, also write the decoded audio to a _diarization.wav file")
+
+    device_options = argparse.ArgumentParser(add_help=False)
+    device_options.add_argument("--device", type=str, default=None, choices=["cuda", "cpu"], help="Device to run on (default: CUDA if available, otherwise CPU; --chunked workers default to CPU)")
+
+    transcription_options = argparse.ArgumentParser(add_help=False)
+    transcription_options.add_argument("--engine", type=str, default=DEFAULT_TRANSCRIBE_OPTIONS['engine'], choices=sorted(TRANSCRIPTION_ENGINES), help="Transcription engine; faster-whisper runs int8-quantized on CPU")
+    transcription_options.add_argument("--model", type=str, default="large-v3", help="Whisper model to use (e.g. tiny, base, small, medium, large-v3)")
+    transcription_options.add_argument("--beam_size", type=int, default=DEFAULT_TRANSCRIBE_OPTIONS['beam_size'], help="Beam size for decoding")
+    transcription_options.add_argument("--best_of", type=int, default=DEFAULT_TRANSCRIBE_OPTIONS['best_of'], help="Number of candidates when sampling with a non-zero temperature")
+    transcription_options.add_argument("--temperature", type=float, default=DEFAULT_TRANSCRIBE_OPTIONS['temperature'], help="Sampling temperature for decoding")
+    transcription_options.add_argument("--chunked", action="store_true", default=False, help="Split long recordings into overlapping chunks and transcribe them in parallel on CPU cores")
+    transcription_options.add_argument("--chunk_seconds", type=float, default=600.0, help="Target chunk length in seconds for --chunked")
+    transcription_options.add_argument("--chunk_overlap", type=float, default=5.0, help="Seconds of audio shared between neighbouring chunks for --chunked")
+    transcription_options.add_argument("--chunk_workers", type=int, default=None, help="Number of worker processes for --chunked (default: a quarter of the CPU cores)")
+
+    diarization_options = argparse.ArgumentParser(add_help=False)
+    diarization_options.add_argument("--diarization_snapshot", type=str, default=None, help="Directory download_model.py saved the diarization models to; loads the pipeline from there without network access")
+
+    word_options = argparse.ArgumentParser(add_help=False)
+    word_options.add_argument("--word_alignment", action="store_true", default=False, help="Attribute speakers per word using Whisper's word timestamps, splitting segments where the speaker changes")
+
+    stream_options = argparse.ArgumentParser(add_help=False)
+    stream_options.add_argument("--stream_formats", nargs="*", default=[], choices=sorted(SEGMENT_WRITERS), help="Also stream aligned segments to _aligned.jsonl/.srt/.vtt files, flushed after every segment")
+    stream_options.add_argument("--resume_output", action="store_true", default=False, help="Append to existing streamed outputs, skipping segments they already contain")
+
+    parser = argparse.ArgumentParser(
+        description="Transcribe audio and identify speakers.",
+        epilog="Without a subcommand, the arguments are passed to 'run'."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert an audio or video file to the WAV files the other steps use")
+    convert_parser.add_argument("filepath", type=str, help="Path to the audio or video file")
+
+    transcribe_parser = subparsers.add_parser("transcribe", parents=[output_options, audio_options, device_options, transcription_options, word_options], help="Transcribe a file to _segments.json and _transcription.txt")
+    transcribe_parser.add_argument("filepath", type=str, help="Path to the audio file")
+
+    diarize_parser = subparsers.add_parser("diarize", parents=[output_options, audio_options, device_options, diarization_options], help="Diarize a file to _diarization.json")
+    diarize_parser.add_argument("filepath", type=str, help="Path to the audio file")
+    diarize_parser.add_argument("num_speakers", type=int, help="Number of speakers")
+    diarize_parser.add_argument("--token", type=str, default=None, help="Hugging Face access token (unused with --diarization_snapshot)")
+
+    align_parser = subparsers.add_parser("align", parents=[output_options, word_options, stream_options], help="Align a _segments.json with a _diarization.json")
+    align_parser.add_argument("segments", type=str, help="Path to the _segments.json written by transcribe")
+    align_parser.add_argument("diarization", type=str, help="Path to the _diarization.json written by diarize")
+
+    run_parser = subparsers.add_parser("run", parents=[output_options, audio_options, device_options, transcription_options, diarization_options, word_options, stream_options], help="Run the whole pipeline on a file or a batch of files")
+    run_parser.add_argument("filepath", type=str, help="Path to the audio file, or with --batch a directory, glob pattern or manifest .txt file")
+    run_parser.add_argument("token", type=str, help="Hugging Face access token (unused with --diarization_snapshot)")
+    run_parser.add_argument("num_speakers", type=int, help="Number of speakers")
+    run_parser.add_argument("--concurrent", action="store_true", default=False, help="Run transcription and diarization in parallel workers")
+    run_parser.add_argument("--cache_dir", type=str, default=None, help="Directory for cached transcription and diarization results, keyed by audio content and settings")
+    run_parser.add_argument("--cache_max_gb", type=float, default=5.0, help="Evict the least recently used cache entries beyond this size")
+    run_parser.add_argument("--metrics", action="store_true", default=False, help="Write per-stage wall time, CPU time, peak memory and real-time factor to a _metrics.json report")
+    run_parser.add_argument("--batch", action="store_true", default=False, help="Process every file matched by filepath, keeping models loaded between files")
+    run_parser.add_argument("--jobs", type=int, default=2, help="Number of files processed at once in --batch mode")
+    run_parser.add_argument("--status_file", type=str, default=None, help="Status manifest for --batch, used to resume (default: batch_status.json in output_dir)")
+    return parser
+
+def main():
+    argv = sys.argv[1:]
+    # Keep the original "filepath token num_speakers" invocation working
+    if argv and argv[0] not in SUBCOMMANDS and argv[0] not in ("-h", "--help"):
+        argv = ["run"] + argv
+
+    args = build_parser().parse_args(argv)
+    SUBCOMMANDS[args.command](args)
 
 if __name__ == "__main__":
     main()
@@ -1,63 +1,218 @@
 import os
 import csv
 import re
+import argparse
+import hashlib
+import json
+import mailbox
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from email import policy
-from email.parser import BytesParser
-
-# Directory where .eml files are located
-eml_directory = "C:/Users/Ignat/Downloads/interest forms"
-output_csv = "interest_forms.csv"
-
-# Pattern to match the interest form fields
-patterns = {
-    "Account type": r"<b>Account type</b><br ?/?>\s*(.*?)\s*<",
-    "Full Name": r"<b>Full Name</b><br ?/?>\s*(.*?)\s*<",
-    "Company Name": r"<b>Company Name</b><br ?/?>\s*(.*?)\s*<",
-    "Business Email Address": r"<b>Business Email Address</b><br ?/?>\s*<a href=\"mailto:(.*?)\">",
-    "Email Address": r"<b>Email Address</b><br ?/?>\s*<a href=\"mailto:(.*?)\">",
-    "Phone Number": r"<b>Phone Number</b><br ?/?>\s*(.*?)\s*<",
-    "Address": r"<b>Address</b><br ?/?>\s*<strong>Country : </strong>(.*?)\s*<",
-    "Industry": r"<b>Industry</b><br ?/?>\s*(.*?)\s*<",
-    "Additional notes": r"<b>Additional notes</b><br ?/?>\s*(.*?)\s*<",
-    "Consent": r"<b>Consent</b><br ?/?>\s*(.*?)\s*<"
+from email.parser import BytesHeaderParser, BytesParser
+
+# Pattern to match the value after each interest form field's label
+value_patterns = {
+    "Account type": r"\s*(.*?)\s*<",
+    "Full Name": r"\s*(.*?)\s*<",
+    "Company Name": r"\s*(.*?)\s*<",
+    "Business Email Address": r"\s*<a href=\"mailto:(.*?)\">",
+    "Email Address": r"\s*<a href=\"mailto:(.*?)\">",
+    "Phone Number": r"\s*(.*?)\s*<",
+    "Address": r"\s*<strong>Country : </strong>(.*?)\s*<",
+    "Industry": r"\s*(.*?)\s*<",
+    "Additional notes": r"\s*(.*?)\s*<",
+    "Consent": r"\s*(.*?)\s*<"
 }
+value_patterns = {field: re.compile(pattern, re.DOTALL) for field, pattern in value_patterns.items()}
+
+# Finds every "<b>Label</b><br>" in one pass over the body
+label_pattern = re.compile(r"<b>(" + "|".join(re.escape(field) for field in value_patterns) + r")</b><br ?/?>")
 
 # Define headers for the CSV file
 headers = [
-    "Account type", "Full Name", "Company Name", "Business Email Address", 
-    "Email Address", "Phone Number", "Address", "Industry", 
+    "Account type", "Full Name", "Company Name", "Business Email Address",
+    "Email Address", "Phone Number", "Address", "Industry",
     "Additional notes", "Consent"
 ]
 
-# Open the output CSV file for writing
-with open(output_csv, mode="w", newline='', encoding="utf-8") as csv_file:
-    writer = csv.DictWriter(csv_file, fieldnames=headers)
-    writer.writeheader()
-
-    # Process each .eml file in the directory
-    for filename in os.listdir(eml_directory):
-        if filename.endswith(".eml"):
-            eml_path = os.path.join(eml_directory, filename)
-            
-            # Parse the .eml file
-            with open(eml_path, "rb") as eml_file:
-                msg = BytesParser(policy=policy.default).parse(eml_file)
-                
-                # Get the email body content
-                if msg.is_multipart():
-                    for part in msg.iter_parts():
-                        if part.get_content_type() == "text/html":
-                            email_body = part.get_payload(decode=True).decode(part.get_content_charset())
-                else:
-                    email_body = msg.get_payload(decode=True).decode(msg.get_content_charset())
-
-                # Extract fields based on patterns
-                entry_data = {}
-                for field, pattern in patterns.items():
-                    match = re.search(pattern, email_body, re.DOTALL)
-                    entry_data[field] = match.group(1).strip() if match else ""
-                
+parser = BytesParser(policy=policy.default)
+header_parser = BytesHeaderParser(policy=policy.default)
+
+# Default directory where .eml files are located, when no mailbox is given
+default_eml_directory = "C:/Users/Ignat/Downloads/interest forms"
+
+# How many messages to hand to the workers ahead of the writer
+messages_in_flight_per_job = 16
+
+def get_email_body(msg):
+    """Returns the message's HTML body, the last text/html part of a multipart message."""
+    email_body = ""
+    if msg.is_multipart():
+        for part in msg.iter_parts():
+            if part.get_content_type() == "text/html":
+                email_body = part.get_payload(decode=True).decode(part.get_content_charset())
+    else:
+        email_body = msg.get_payload(decode=True).decode(msg.get_content_charset())
+    return email_body
+
+def extract_fields(email_body):
+    """
+    Scans the body once for the field labels and reads each field's value right
+    after its label. Like searching for each field on its own, the first label
+    whose value matches wins.
+    """
+    entry_data = dict.fromkeys(headers, "")
+    found = set()
+    for label in label_pattern.finditer(email_body):
+        field = label.group(1)
+        if field in found:
+            continue
+        match = value_patterns[field].match(email_body, label.end())
+        if match:
+            entry_data[field] = match.group(1).strip()
+            found.add(field)
+    return entry_data
+
+def process_message(raw_message):
+    """Returns the form fields of one raw email, or None if its body can't be decoded."""
+    # Parse the raw email
+    msg = parser.parsebytes(raw_message)
+    try:
+        email_body = get_email_body(msg)
+    except (TypeError, LookupError, ValueError, AttributeError):
+        # No or unknown charset, or a body that doesn't decode with it
+        return None
+    return extract_fields(email_body)
+
+def iter_raw_messages(args):
+    """
+    Yields the raw bytes of every message, from loose .eml files and straight out
+    of mbox files and Maildir folders, one message at a time.
+    """
+    for eml_directory in args.eml_directory:
+        for filename in sorted(os.listdir(eml_directory)):
+            if filename.endswith(".eml"):
+                with open(os.path.join(eml_directory, filename), "rb") as eml_file:
+                    yield eml_file.read()
+    for mbox_path in args.mbox:
+        box = mailbox.mbox(mbox_path, create=False)
+        try:
+            for key in box.iterkeys():
+                yield box.get_bytes(key)
+        finally:
+            box.close()
+    for maildir_path in args.maildir:
+        box = mailbox.Maildir(maildir_path, create=False)
+        for key in sorted(box.iterkeys()):
+            yield box.get_bytes(key)
+
+def message_key(raw_message):
+    """Identifies a message by its Message-ID, or by a hash of its bytes if it has none."""
+    message_id = header_parser.parsebytes(raw_message).get("Message-ID")
+    if message_id:
+        return str(message_id).strip()
+    return "sha256:" + hashlib.sha256(raw_message).hexdigest()
+
+def submitter_email(entry_data):
+    return (entry_data["Business Email Address"] or entry_data["Email Address"]).strip().lower()
+
+def load_state(state_file):
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, "r", encoding="utf-8") as file:
+        state = json.load(file)
+    return {"messages": set(state["messages"]), "emails": set(state["emails"])}
+
+def save_state(state, state_file):
+    # Write to a temporary file first so a crash never leaves a truncated state file
+    temp_path = state_file + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump({"messages": sorted(state["messages"]), "emails": sorted(state["emails"])}, file)
+    os.replace(temp_path, state_file)
+
+def ordered_map(executor, func, keyed_items, in_flight):
+    """
+    Like executor.map over (key, item) pairs, yielding (key, result), but only
+    keeps a bounded number of items submitted ahead of the results being
+    consumed, so a huge mailbox isn't read into memory at once.
+    """
+    pending = deque()
+    for key, item in keyed_items:
+        pending.append((key, executor.submit(func, item)))
+        if len(pending) >= in_flight:
+            key, future = pending.popleft()
+            yield key, future.result()
+    while pending:
+        key, future = pending.popleft()
+        yield key, future.result()
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Extract interest form submissions from emails into a CSV.")
+    arg_parser.add_argument("--eml_directory", action="append", default=[], help=f"Directory of .eml files (repeatable). Defaults to {default_eml_directory} when no mailbox is given")
+    arg_parser.add_argument("--mbox", action="append", default=[], help="mbox file to read messages from (repeatable)")
+    arg_parser.add_argument("--maildir", action="append", default=[], help="Maildir folder to read messages from (repeatable)")
+    arg_parser.add_argument("--output_csv", default="interest_forms.csv", help="CSV file to write")
+    arg_parser.add_argument("--state_file", default=None, help="Seen Message-IDs and emails, so re-runs only append new submissions (default: <output_csv>.state.json)")
+    arg_parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of processes parsing emails in parallel")
+    args = arg_parser.parse_args()
+
+    if not (args.eml_directory or args.mbox or args.maildir):
+        args.eml_directory = [default_eml_directory]
+    state_file = args.state_file or args.output_csv + ".state.json"
+
+    # With a state file from an earlier run, only new submissions are appended to its CSV
+    state = load_state(state_file) if os.path.exists(args.output_csv) else None
+    appending = state is not None
+    if not appending:
+        state = {"messages": set(), "emails": set()}
+
+    def new_messages():
+        # A message is only added to the state once its row is written or skipped,
+        # so this also drops copies of a message that is still being parsed
+        queued = set()
+        for raw_message in iter_raw_messages(args):
+            key = message_key(raw_message)
+            if key not in state["messages"] and key not in queued:
+                queued.add(key)
+                yield key, raw_message
+
+    written = skipped = failed = 0
+    # Open the output CSV file for writing
+    with open(args.output_csv, mode="a" if appending else "w", newline='', encoding="utf-8") as csv_file, \
+            ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        writer = csv.DictWriter(csv_file, fieldnames=headers)
+        if not appending:
+            writer.writeheader()
+
+        try:
+            # Entries come back in message order while the workers parse ahead
+            for key, entry_data in ordered_map(executor, process_message, new_messages(), args.jobs * messages_in_flight_per_job):
+                if entry_data is None:
+                    # Left out of the state so the next run tries it again
+                    print(f"Could not decode message {key}, skipping it.")
+                    failed += 1
+                    continue
+                # Keep only the first submission from each email
+                email = submitter_email(entry_data)
+                if email and email in state["emails"]:
+                    skipped += 1
+                    state["messages"].add(key)
+                    continue
+                if email:
+                    state["emails"].add(email)
                 # Write the extracted data to the CSV file
                 writer.writerow(entry_data)
+                state["messages"].add(key)
+                written += 1
+                if written % 500 == 0:
+                    csv_file.flush()
+                    save_state(state, state_file)
+        finally:
+            # Even when the run dies, the state matches the rows that made it to the CSV
+            csv_file.flush()
+            save_state(state, state_file)
+
+    print(f"Data successfully extracted to {args.output_csv}: {written} new submissions, {skipped} repeat submissions skipped, {failed} messages could not be decoded.")
 
-print(f"Data successfully extracted to {output_csv}.")
+if __name__ == "__main__":
+    main()